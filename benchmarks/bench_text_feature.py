@@ -0,0 +1,136 @@
+"""
+Micro-benchmark of the text features search
+on a synthetic product titles corpus.
+
+Usage: python benchmarks/bench_text_feature.py [rows]
+"""
+
+import sys
+import time
+import random
+import pandas as pd
+import regex as re
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from notation import DATA, FEATURES
+from features_collection import FutureList
+from text_feature import TextFeatureSearch, FeatureSearchMode
+
+
+GOODS = [
+    "Молоко Простоквашино",
+    "Кефир Danone",
+    "Шампунь Head&Shoulders",
+    "Флешка Kingston",
+    "Ибупрофен",
+    "Кабель USB",
+    "Коробка картонная",
+    "Краска акриловая",
+    "Сок Добрый",
+    "Витамин D3",
+]
+FEATURES_VALUES = [
+    "{n} мл",
+    "{n}мл",
+    "{n} л",
+    "{n} г",
+    "{n}кг",
+    "{n} мг",
+    "{n} ГБ",
+    "{n} шт",
+    "{n}x{m} см",
+    "{n}х{m}х{k} мм",
+    "{n} мг/мл",
+    "{n}%",
+    "таб.",
+    "капли",
+    "черный",
+    "белый",
+    "{n} м",
+]
+
+
+def make_titles(rows: int = 10_000, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+
+    def number():
+        return rng.choice([str(rng.randint(1, 1000)), f"{rng.randint(0, 9)},{rng.randint(1, 9)}"])
+
+    titles = []
+    for _ in range(rows):
+        features = [
+            rng.choice(FEATURES_VALUES).format(n=number(), m=number(), k=number())
+            for _ in range(rng.randint(0, 4))
+        ]
+        titles.append(" ".join([rng.choice(GOODS)] + features))
+    return titles
+
+
+def make_data(rows: int = 10_000, seed: int = 0) -> pd.DataFrame:
+    client = make_titles(rows, seed)
+    source = make_titles(rows, seed + 1)
+    # a half of the pairs describe the same good
+    source = [c if index % 2 else s for index, (c, s) in enumerate(zip(client, source))]
+
+    data = pd.DataFrame({DATA.CLIENT_NAME: client, DATA.ROW: source})
+    data[DATA.VALIDATION_STATUS] = 0
+    data[DATA.VALIDATED] = 1
+    data[FEATURES.VALIDATED] = 1
+    data[FEATURES.NOT_FOUND] = ""
+    return data
+
+
+def bench_findall(titles: list[str]) -> None:
+    designations = [
+        designation
+        for future in FutureList()
+        for designation in future.designations
+    ]
+
+    start = time.perf_counter()
+    raw = [
+        re.findall(designation.regex, title, re.IGNORECASE)
+        for designation in designations
+        for title in titles
+    ]
+    raw_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compiled = [
+        designation.compiled.findall(title)
+        for designation in designations
+        for title in titles
+    ]
+    compiled_time = time.perf_counter() - start
+
+    assert raw == compiled
+    print(f"findall: {len(designations)} designations x {len(titles)} titles")
+    print(f"  raw patterns:      {raw_time:.2f}s")
+    print(f"  compiled patterns: {compiled_time:.2f}s")
+
+
+def bench_validate(data: pd.DataFrame) -> None:
+    print(f"TextFeatureSearch.validate ({len(data)} rows)")
+    for search_mode in [
+        FeatureSearchMode.SEPARATE,
+        FeatureSearchMode.FUSED,
+    ]:
+        search = TextFeatureSearch(
+            skip_validated=False,
+            skip_intermediate_validated=False,
+            search_mode=search_mode,
+        )
+
+        start = time.perf_counter()
+        search.validate(data.copy(), None)
+        print(f"  {search_mode + ':':18} {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+
+    data = make_data(rows)
+    bench_findall(data[DATA.CLIENT_NAME].to_list())
+    bench_validate(data)
@@ -0,0 +1,27 @@
+"""
+Convert data files (.xlsx archives of semantic, raw and validation data)
+into a columnar format once, so DataRepr reads them without parsing workbooks.
+
+Usage: python convert.py <path> [<path> ...] [--format parquet|feather|csv]
+"""
+
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent / "src"))
+
+from src.util import DataFormat, convert_data
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+
+    data_format = DataFormat.PARQUET
+    if "--format" in args:
+        position = args.index("--format")
+        data_format = args[position + 1]
+        args = args[:position] + args[position + 2 :]
+
+    for path in args:
+        output_path = convert_data(path, data_format)
+        print("CONVERTED", path, "->", output_path)
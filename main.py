@@ -11,21 +11,25 @@ sys.path.append(str(Path(__file__).parent / "src"))
 
 from src.util import DataRepr, DataReprMode
 from src.vendor_code import VendorCodeSearch, VendorCodeExtractor
-from src.text_feature import TextFeatureSearch
+from src.text_feature import TextFeatureSearch, FeatureSearchMode
 from src.metrics import Metric, JakkarMetric
+from candidates import CandidateGenerator
+from output import OutputWriter, ListMode, write_data
+from cache import BoundedCache
 from notation import DATA, VENDOR_CODE, FEATURES, JAKKAR
 from main_util import TEST_DATA
 from jakkar.jakkar import (
     FuzzyJakkarValidator,
-    RegexTokenizer,
+    SinglePassRegexTokenizer,
     LanguageType,
     RegexCustomWeights,
     FuzzySearch,
+    FuzzyBlockingIndex,
     TokenTransformer,
     Preprocessor,
-    RateCounter,
+    VectorRateCounter,
     RateFunction,
-    MarksCounter,
+    SparseMarksCounter,
     MarksMode,
 )
 from src.features_collection import (
@@ -72,7 +76,9 @@ class Validator(object):
             raw_path,
             validation_path,
         )
+        return self._init_columns(data)
 
+    def _init_columns(self, data: pd.DataFrame) -> pd.DataFrame:
         data[DATA.VALIDATION_STATUS] = 0
         data[DATA.VALIDATED] = 1
         data[VENDOR_CODE.VALIDATED] = 1
@@ -90,6 +96,20 @@ class Validator(object):
         new_data, columns = function(data, self.process_pool)
 
         data.loc[new_data.index, columns] = new_data[columns]
+        # status of the stage (e.g. FEATURES.CACHE_STATS) goes to the result too
+        data.attrs.update(new_data.attrs)
+        return data
+
+    def _process_stages(self, data: pd.DataFrame) -> pd.DataFrame:
+        if self.VC is not None:
+            data = self._process_validation(self.VC.validate, data)
+
+        if self.TF is not None:
+            data = self._process_validation(self.TF.validate, data)
+
+        if self.jakkar is not None:
+            data = self._process_validation(self.jakkar.validate, data)
+
         return data
 
     def validate(
@@ -104,19 +124,119 @@ class Validator(object):
             validation_path,
         )
 
-        if self.VC is not None:
-            data = self._process_validation(self.VC.validate, data)
+        data = self._process_stages(data)
 
-        if self.TF is not None:
-            data = self._process_validation(self.TF.validate, data)
+        if self.process_pool:
+            self.process_pool.close()
 
-        if self.jakkar is not None:
-            data = self._process_validation(self.jakkar.validate, data)
+        return data
+
+    def validate_chunks(
+        self,
+        validation_path: str,
+        output_path: str,
+        chunk_size: int = 100_000,
+        two_pass: bool = True,
+        list_mode: str = ListMode.JOINED,
+    ) -> int:
+        """
+        Validate the validation file by chunks of rows and append every
+        validated chunk to the output file (OutputWriter), so the memory
+        is bounded by the chunk size. Returns count of the validated rows.
+
+        - two_pass - the first pass over the file only counts the tokens,
+        so the jakkar ratio is the same as for the whole file;
+        otherwise the ratio is counted by the tokens of every chunk
+        - list_mode - how list columns are written (ListMode)
+        """
+        if self.jakkar is not None and two_pass:
+            print("FIRST PASS: COUNT TOKENS")
+            for data in self.data_repr.proccess_chunks(validation_path, chunk_size):
+                self.jakkar.accumulate(data, self.process_pool)
+            self.jakkar.fix_ratio()
+
+        writer = OutputWriter(output_path, list_mode)
+        try:
+            chunks = self.data_repr.proccess_chunks(validation_path, chunk_size)
+            for number, data in enumerate(chunks):
+                print("CHUNK", number, "ROWS", len(data))
+                data = self._init_columns(data)
+                data = self._process_stages(data)
+                writer.write(data)
+        finally:
+            writer.close()
+            if self.jakkar is not None:
+                self.jakkar.free_ratio()
 
         if self.process_pool:
             self.process_pool.close()
 
-        return data
+        return writer.rows
+
+    def validate_decart(
+        self,
+        semantic_path: str,
+        raw_path: str,
+        output_path: str,
+        block_size: int = 100_000,
+        two_pass: bool = True,
+        cutoff_column: Union[str, None] = DATA.VALIDATED,
+        cutoff: float = 1,
+        candidates: Union[CandidateGenerator, None] = None,
+        list_mode: str = ListMode.JOINED,
+    ) -> int:
+        """
+        Validate the Cartesian product of the site rows and the semantic
+        (DataReprMode.RAW_DECART) by blocks of pairs without materialization
+        of the whole product. Sides strings repeat in every block, so the
+        stages with cache (TF cache, tokenizer cache, fuzzy cache) process
+        every side row once. Returns count of the written pairs.
+
+        - two_pass, list_mode - as in validate_chunks
+        - cutoff_column - only pairs with cutoff_column >= cutoff are written
+        to the output (e.g. marks_union with 0.5), None - all pairs
+        - candidates - validate only the candidate pairs (top k semantic rows
+        for every site row), None - all pairs. The ratio is counted by the
+        tokens of the whole product anyway (by its sides, before fuzzy search)
+        """
+        decart = self.data_repr.proccess_lazy(semantic_path, raw_path)
+        print("DECART PAIRS", len(decart))
+
+        pairs = None
+        if candidates is not None:
+            pairs = candidates.generate(decart)
+
+        if self.jakkar is not None and pairs is not None:
+            # candidates only select the pairs to validate,
+            # the ratio is counted by the whole product
+            print("FIRST PASS: COUNT TOKENS OF THE PRODUCT")
+            self.jakkar.accumulate_product(decart.semantic, decart.site)
+            self.jakkar.fix_ratio()
+        elif self.jakkar is not None and two_pass:
+            print("FIRST PASS: COUNT TOKENS")
+            for pair_ids in decart.blocks(block_size):
+                self.jakkar.accumulate(decart.materialize(pair_ids), self.process_pool)
+            self.jakkar.fix_ratio()
+
+        writer = OutputWriter(output_path, list_mode)
+        try:
+            for number, pair_ids in enumerate(decart.blocks(block_size, pairs)):
+                print("BLOCK", number, "PAIRS", len(pair_ids))
+                data = self._init_columns(decart.materialize(pair_ids))
+                data = self._process_stages(data)
+
+                if cutoff_column is not None:
+                    data = data[data[cutoff_column] >= cutoff]
+                writer.write(data)
+        finally:
+            writer.close()
+            if self.jakkar is not None:
+                self.jakkar.free_ratio()
+
+        if self.process_pool:
+            self.process_pool.close()
+
+        return writer.rows
 
 
 if __name__ == "__main__":
@@ -146,20 +266,28 @@ if __name__ == "__main__":
         skip_validated=False,
         skip_intermediate_validated=False,
         custom_features_list=custom_features_list,
+        search_mode=FeatureSearchMode.FUSED,
+        cache=BoundedCache(path=FEATURES.CACHE_PATH),
     )
 
     jakkar = FuzzyJakkarValidator(
-        tokenizer=RegexTokenizer(
+        tokenizer=SinglePassRegexTokenizer(
             {
                 LanguageType.RUS: 1,
                 LanguageType.ENG: 1,
             },
             weights_rules=RegexCustomWeights(1, 1, 1, 1),
+            cache=BoundedCache(path=JAKKAR.TOKENS_CACHE_PATH),
         ),
         preprocessor=Preprocessor(2),
-        fuzzy=FuzzySearch(75, transformer=TokenTransformer()),
-        rate_counter=RateCounter(0, 1, 2, 0, RateFunction.sqrt2),
-        marks_counter=MarksCounter(MarksMode.MULTIPLE),
+        fuzzy=FuzzySearch(
+            75,
+            transformer=TokenTransformer(),
+            blocking_index=FuzzyBlockingIndex(),
+            cache=BoundedCache(path=JAKKAR.FUZZY_CACHE_PATH),
+        ),
+        rate_counter=VectorRateCounter(0, 1, 2, 0, RateFunction.sqrt2),
+        marks_counter=SparseMarksCounter(MarksMode.MULTIPLE),
         validation_treshold=0.5,
         debug=True,
     )
@@ -179,4 +307,4 @@ if __name__ == "__main__":
     )
     print("FINISHED IN", round(time.time() - start), "SECONDS")
 
-    result.to_excel("output.xlsx", index=False)
+    write_data(result, "output.parquet")
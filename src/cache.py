@@ -0,0 +1,105 @@
+import pickle
+from pathlib import Path
+from collections import OrderedDict
+from collections.abc import Hashable
+from typing import Any, Union
+
+
+class BoundedCache(object):
+    """
+    LRU cache with hits and misses counters.
+
+    - max_size - max count of stored items (0 - unbounded)
+    - path - pickle file to keep the cache between runs
+    (loaded on init if exists, saved by save())
+    - version - version of the cached values; stored cache
+    with another version is ignored on load
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1_000_000,
+        path: Union[str, Path, None] = None,
+        version: str = "",
+    ) -> None:
+        if max_size < 0:
+            raise ValueError("Cache max size should be positive or 0")
+
+        self.max_size = max_size
+        self.path = path
+        self.version = version
+
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+
+        if self.path is not None:
+            self.load()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            value = self._items[key]
+        except KeyError:
+            self.misses += 1
+            return default
+
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Get the value without counting hits and misses and LRU order"""
+        return self._items.get(key, default)
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._items[key] = value
+        self._items.move_to_end(key)
+        self._trim()
+
+    def _trim(self) -> None:
+        if self.max_size:
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @property
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._items),
+            "hit_rate": round(self.hits / requests, 4) if requests else 0,
+        }
+
+    def reset_stats(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self) -> None:
+        self._items.clear()
+        self.reset_stats()
+
+    def load(self) -> None:
+        path = Path(self.path)
+        if not path.exists():
+            return
+
+        with open(path, "rb") as file:
+            version, items = pickle.load(file)
+
+        if version == self.version:
+            self._items = OrderedDict(items)
+            self._trim()
+
+    def save(self) -> None:
+        if self.path is None:
+            raise ValueError("Cache path isn't set")
+
+        with open(self.path, "wb") as file:
+            pickle.dump((self.version, list(self._items.items())), file)
@@ -0,0 +1,300 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from typing import Union
+
+from notation import DATA, CANDIDATES
+from util import LazyDecart
+from vendor_code import VendorCodeIndex
+from text_feature import TextFeatureSearch
+from jakkar.jakkar import BasicTokenizer, RateCounter, TokenVocabulary
+
+
+class CandidateGenerator(object):
+    """
+    Candidate pairs of the Cartesian product (LazyDecart): top_k semantic
+    rows for every site row by the cheap signals, so only the candidates
+    go to the expensive stages (fuzzy Jakkar).
+
+    Score of the pair:
+    - rare tokens - sum of the ratio (RateCounter of the tokens of both
+    sides) of the shared tokens divided by the ratio sum of the site tokens
+    - vc_weight - if the vendor code of the semantic row is in the site row
+    (VendorCodeIndex)
+    - brand_weight - if the brands of the sides are equal
+    (LazyDecart.site_brands and LazyDecart.semantic_brands)
+    - features_weight * share of the site row features (e.g. Weight, Volume)
+    found in the semantic row; added to the pairs of the other signals only
+
+    - tokenizer - tokenizer of the rows (jakkar tokenizers)
+    - rate_counter - ratio of the tokens
+    - features - TextFeatureSearch with the features to compare
+    - top_k - count of the candidates for every site row
+    - token_min_rate - tokens with the lower ratio aren't signals
+    """
+
+    def __init__(
+        self,
+        tokenizer: BasicTokenizer,
+        rate_counter: RateCounter,
+        features: Union[TextFeatureSearch, None] = None,
+        top_k: int = 10,
+        token_min_rate: float = 0.05,
+        vc_weight: float = 1,
+        brand_weight: float = 0.5,
+        features_weight: float = 0.5,
+    ) -> None:
+        if top_k <= 0:
+            raise ValueError("Top k should be positive")
+
+        self.tokenizer = tokenizer
+        self.rate_counter = rate_counter
+        self.features = features
+        self.top_k = top_k
+        self.token_min_rate = token_min_rate
+        self.vc_weight = vc_weight
+        self.brand_weight = brand_weight
+        self.features_weight = features_weight
+
+    def _tokenize(self, rows: pd.Series, column: str) -> list:
+        data = pd.DataFrame({DATA.ROW: rows.fillna("").astype(str).to_numpy()})
+        return self.tokenizer.tokenize(data, DATA.ROW, column)[column].to_list()
+
+    def _count_ratio(self, site_tokens: list, semantic_tokens: list) -> dict:
+        # count_ratio counts the tokens of two columns of the same length
+        length = max(len(site_tokens), len(semantic_tokens))
+        data = pd.DataFrame(
+            {
+                CANDIDATES.SITE_TOKENS: site_tokens
+                + [[]] * (length - len(site_tokens)),
+                CANDIDATES.SEMANTIC_TOKENS: semantic_tokens
+                + [[]] * (length - len(semantic_tokens)),
+            }
+        )
+        return self.rate_counter.count_ratio(
+            data,
+            CANDIDATES.SITE_TOKENS,
+            CANDIDATES.SEMANTIC_TOKENS,
+        )
+
+    def _tokens_matrix(
+        self,
+        tokens: list,
+        ratio: dict,
+        vocabulary: TokenVocabulary,
+        weighted: bool,
+    ) -> sparse.csr_matrix:
+        """Rows x tokens matrix of the rare tokens (rate * weight or presence)"""
+
+        rows, ids, values = [], [], []
+        for row, row_tokens in enumerate(tokens):
+            row_values = {}
+            for token in row_tokens:
+                rate = ratio.get(token.value, 0)
+                if rate <= 0 or rate < self.token_min_rate:
+                    continue
+                value = rate * token.custom_weight if weighted else 1
+                row_values[token.value] = max(row_values.get(token.value, 0), value)
+
+            rows.extend([row] * len(row_values))
+            ids.extend(vocabulary.get_ids(row_values, len(row_values)).tolist())
+            values.extend(row_values.values())
+
+        return sparse.csr_matrix(
+            (np.array(values, dtype=np.float64), (rows, ids)),
+            shape=(len(tokens), len(vocabulary)),
+        )
+
+    def _tokens_scores(self, decart: LazyDecart) -> sparse.csr_matrix:
+        site_tokens = self._tokenize(decart.site[DATA.ROW], CANDIDATES.SITE_TOKENS)
+        semantic_tokens = self._tokenize(
+            decart.semantic[DATA.CLIENT_NAME],
+            CANDIDATES.SEMANTIC_TOKENS,
+        )
+        ratio = self._count_ratio(site_tokens, semantic_tokens)
+
+        vocabulary = TokenVocabulary()
+        site = self._tokens_matrix(site_tokens, ratio, vocabulary, True)
+        semantic = self._tokens_matrix(semantic_tokens, ratio, vocabulary, False)
+        site.resize((site.shape[0], len(vocabulary)))
+
+        totals = np.asarray(site.sum(axis=1)).ravel()
+        totals[totals == 0] = 1
+        scores = (site @ semantic.T).tocsr()
+        return sparse.diags(1 / totals) @ scores
+
+    def _pairs_matrix(
+        self,
+        site_positions: list[int],
+        semantic_positions: list[int],
+        decart: LazyDecart,
+    ) -> sparse.csr_matrix:
+        matrix = sparse.csr_matrix(
+            (
+                np.ones(len(site_positions), dtype=np.float64),
+                (site_positions, semantic_positions),
+            ),
+            shape=(len(decart.site), len(decart.semantic)),
+        )
+        matrix.data[:] = 1  # duplicated pairs are summed up
+        return matrix
+
+    def _vc_scores(self, decart: LazyDecart) -> sparse.csr_matrix:
+        codes = decart.semantic[DATA.VC]
+        codes = codes[codes.notna()].astype(str)
+        codes = codes[codes.str.strip() != ""]
+
+        value_codes, values = pd.factorize(codes)
+        index = VendorCodeIndex(list(values))
+        semantic_by_value = pd.Series(codes.index).groupby(value_codes).agg(list)
+
+        site_positions, semantic_positions = [], []
+        rows = decart.site[DATA.ROW].fillna("").astype(str)
+        row_codes, row_values = pd.factorize(rows)
+        found = [index.findall(row) for row in row_values]
+        for site_position, row_code in enumerate(row_codes):
+            for value_code in found[row_code]:
+                positions = semantic_by_value[value_code]
+                site_positions.extend([site_position] * len(positions))
+                semantic_positions.extend(positions)
+
+        return self._pairs_matrix(site_positions, semantic_positions, decart)
+
+    def _brand_scores(self, decart: LazyDecart) -> sparse.csr_matrix:
+        if decart.site_brands is None or decart.semantic_brands is None:
+            return self._pairs_matrix([], [], decart)
+
+        def normalize(brands: pd.Series) -> pd.Series:
+            brands = brands.astype(object).where(brands.notna(), "").astype(str)
+            return brands.str.strip().str.lower()
+
+        site = pd.DataFrame(
+            {
+                CANDIDATES.BRAND: normalize(decart.site_brands),
+                CANDIDATES.SITE_POSITION: np.arange(len(decart.site)),
+            }
+        )
+        semantic = pd.DataFrame(
+            {
+                CANDIDATES.BRAND: normalize(decart.semantic_brands),
+                CANDIDATES.SEMANTIC_POSITION: np.arange(len(decart.semantic)),
+            }
+        )
+
+        pairs = site[site[CANDIDATES.BRAND] != ""].merge(semantic, on=CANDIDATES.BRAND)
+        return self._pairs_matrix(
+            pairs[CANDIDATES.SITE_POSITION].to_list(),
+            pairs[CANDIDATES.SEMANTIC_POSITION].to_list(),
+            decart,
+        )
+
+    def _features_matrix(
+        self,
+        rows: pd.Series,
+        keys: dict,
+    ) -> sparse.csr_matrix:
+        """Rows x (feature, standard value) presence matrix"""
+
+        row_codes, row_values = pd.factorize(rows.fillna("").astype(str))
+        found = [
+            {
+                keys.setdefault((name, feature.standard_value), len(keys))
+                for name, features in self.features.row_features(row).items()
+                for feature in features
+            }
+            for row in row_values
+        ]
+
+        ids = [found[code] for code in row_codes]
+        lengths = [len(row_ids) for row_ids in ids]
+        return sparse.csr_matrix(
+            (
+                np.ones(sum(lengths), dtype=np.float64),
+                [key for row_ids in ids for key in row_ids],
+                np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+            ),
+            shape=(len(rows), len(keys)),
+        )
+
+    def _features_scores(
+        self,
+        decart: LazyDecart,
+        scores: sparse.csr_matrix,
+    ) -> sparse.csr_matrix:
+        """Share of the site features found in the semantic row (for the pairs)"""
+
+        keys = {}
+        site = self._features_matrix(decart.site[DATA.ROW], keys)
+        semantic = self._features_matrix(decart.semantic[DATA.CLIENT_NAME], keys)
+        site.resize((site.shape[0], len(keys)))
+
+        pairs = scores.tocoo()
+        shared = np.asarray(
+            site[pairs.row].multiply(semantic[pairs.col]).sum(axis=1)
+        ).ravel()
+        totals = np.asarray(site.sum(axis=1)).ravel()[pairs.row]
+
+        share = np.zeros(len(shared), dtype=np.float64)
+        np.divide(shared, totals, out=share, where=totals != 0)
+        return sparse.csr_matrix(
+            (share, (pairs.row, pairs.col)),
+            shape=scores.shape,
+        )
+
+    def scores(self, decart: LazyDecart) -> sparse.csr_matrix:
+        """Site rows x semantic rows matrix of the pairs scores"""
+
+        print("Candidates: rare tokens")
+        scores = self._tokens_scores(decart)
+
+        print("Candidates: vendor codes")
+        scores = scores + self.vc_weight * self._vc_scores(decart)
+
+        print("Candidates: brands")
+        scores = scores + self.brand_weight * self._brand_scores(decart)
+        scores = scores.tocsr()
+        scores.eliminate_zeros()
+
+        if self.features is not None:
+            print("Candidates: features")
+            scores = scores + self.features_weight * self._features_scores(
+                decart,
+                scores,
+            )
+        return scores.tocsr()
+
+    def _top_k(self, scores: sparse.csr_matrix, columns: int) -> np.ndarray:
+        """Pair ids of top_k scores of every row (the first columns on ties)"""
+
+        pair_ids = []
+        for row in range(scores.shape[0]):
+            start, end = scores.indptr[row], scores.indptr[row + 1]
+            row_columns = scores.indices[start:end]
+            row_scores = scores.data[start:end]
+
+            order = np.lexsort((row_columns, -row_scores))[: self.top_k]
+            pair_ids.append(row * columns + row_columns[order].astype(np.int64))
+
+        if not pair_ids:
+            return np.array([], dtype=np.int64)
+        return np.sort(np.concatenate(pair_ids))
+
+    def generate(self, decart: LazyDecart) -> np.ndarray:
+        """Return sorted pair ids of the candidates (see LazyDecart)"""
+
+        scores = self.scores(decart)
+        scores.eliminate_zeros()
+
+        candidates = self._top_k(scores, len(decart.semantic))
+        print(f"Candidates: {len(candidates)} of {len(decart)} pairs")
+
+        if decart.labels is not None:
+            recall = self.recall(candidates, decart.labels)
+            print("Candidates recall:", round(recall, 4))
+        return candidates
+
+    def recall(self, candidates: np.ndarray, labels: np.ndarray) -> float:
+        """Share of the labeled pairs (MyMark) in the candidates"""
+        if not len(labels):
+            return 1.0
+        return np.isin(labels, candidates).sum() / len(labels)
@@ -1,7 +1,9 @@
 from abc import ABC
+import hashlib
 import regex as re
 from collections import namedtuple
 from decimal import Decimal
+from typing import Union
 
 
 class FeatureValidationMode(object):
@@ -16,6 +18,79 @@ class FeatureNotFoundMode(object):
     MODEST = "modest"
 
 
+class FixedPoint(object):
+    """
+    Exact fixed-point numbers (opt-in instead of Decimal).
+
+    The value is integer count of 10 ** -scale units. Values, which aren't
+    representable by the scale, stay Decimal count of the units: they are
+    not integral, so the equality of the values is the same as of Decimal.
+    Numbers are kept as (mantissa, exponent) pairs while computing.
+    """
+
+    @staticmethod
+    def parse(value: str) -> tuple[int, int]:
+        integer, _, fraction = value.replace(",", ".").partition(".")
+        return int(integer + fraction), -len(fraction)
+
+    @staticmethod
+    def from_decimal(value: Union[Decimal, float]) -> tuple[int, int]:
+        sign, digits, exponent = Decimal(str(value)).as_tuple()
+        mantissa = int("".join(map(str, digits)))
+        return -mantissa if sign else mantissa, exponent
+
+    @staticmethod
+    def multiply(*numbers: tuple[int, int]) -> tuple[int, int]:
+        mantissa, exponent = 1, 0
+        for number in numbers:
+            mantissa *= number[0]
+            exponent += number[1]
+        return mantissa, exponent
+
+    @staticmethod
+    def units(number: tuple[int, int], scale: int) -> Union[int, Decimal]:
+        mantissa, exponent = number
+        exponent += scale
+        if exponent >= 0:
+            return mantissa * 10**exponent
+
+        quotient, remainder = divmod(mantissa, 10**-exponent)
+        if remainder == 0:
+            return quotient
+        return Decimal(mantissa).scaleb(exponent)
+
+    @staticmethod
+    def divide(
+        numerator: tuple[int, int],
+        denominator: tuple[int, int],
+        scale: int,
+    ) -> Union[int, None]:
+        """Return units of the quotient, None if it isn't representable"""
+        (top, top_exponent), (bot, bot_exponent) = numerator, denominator
+        exponent = top_exponent - bot_exponent + scale
+        if exponent >= 0:
+            top *= 10**exponent
+        else:
+            bot *= 10**-exponent
+
+        quotient, remainder = divmod(top, bot)
+        if remainder == 0:
+            return quotient
+        return None
+
+    @staticmethod
+    def decimal_units(value: Decimal, scale: int) -> Union[int, Decimal]:
+        """Return units of the Decimal value (integer if it is integral)"""
+        value = value.scaleb(scale)
+        if value == value.to_integral_value():
+            return int(value)
+        return value
+
+    @staticmethod
+    def to_str(value: Union[int, Decimal], scale: int) -> str:
+        return format(Decimal(value).scaleb(-scale).normalize(), "f")
+
+
 class Type(object):
     def __init__(
         self,
@@ -26,6 +101,12 @@ class Type(object):
         self.name = name
         self.designation = designation
         self.regex = regex
+        self.compiled = None
+
+    def compile(self) -> None:
+        """Compile the regex of the type (once)"""
+        if self.compiled is None:
+            self.compiled = re.compile(self.regex, re.IGNORECASE)
 
 
 class FeatureTypes(object):
@@ -39,8 +120,6 @@ class FeatureTypes(object):
         self.postfix = postfix
         self.types = self._prepare(types)
 
-        self.__index = 0
-
     def _make_regex(self, type_: Type) -> Type:
         return f"{self.prefix}{type_.designation}{self.postfix}"
 
@@ -50,10 +129,16 @@ class FeatureTypes(object):
                 type_.regex = self._make_regex(type_)
         return types
 
+    def compile(self) -> None:
+        for type_ in self.types:
+            type_.compile()
+
+    def candidates_regex(self) -> str:
+        """Return regex, which matches at every position where any type matches"""
+        return "|".join(f"(?:{type_.regex})" for type_ in self.types)
+
     def __iter__(self):
-        while self.__index < len(self.types):
-            yield self.types[self.__index]
-            self.__index += 1
+        return iter(self.types)
 
 
 class AbstractFeature(ABC):
@@ -62,6 +147,7 @@ class AbstractFeature(ABC):
     VALIDATION_MODE: FeatureValidationMode
     NOT_FOUND_MODE: FeatureNotFoundMode
     PRIORITY: int = 10
+    FIXED_POINT_SCALE: int = 9
 
     def __init__(self, v) -> None:
         self.standard_value = v
@@ -136,6 +222,13 @@ class Measure(object):
         self.weight = weight
         self.designation = designation
         self.regex = regex
+        self.compiled = None
+        self.fixed_weight = FixedPoint.from_decimal(weight)
+
+    def compile(self) -> None:
+        """Compile the regex of the measure (once)"""
+        if self.compiled is None:
+            self.compiled = re.compile(self.regex, re.IGNORECASE)
 
 
 class FeatureMeasures(object):
@@ -151,8 +244,6 @@ class FeatureMeasures(object):
         self.postfix = postfix
         self.measures = self._prepare(measures)
 
-        self.__index = 0
-
     def _make_regex(self, measure: Measure) -> str:
         return f"{self.prefix}({self.numerical_regex}(?:{measure.designation})){self.postfix}"
 
@@ -162,15 +253,31 @@ class FeatureMeasures(object):
     ) -> list[Measure]:
         for measure in measures:
             measure.weight = Decimal(str(measure.weight))
+            measure.fixed_weight = FixedPoint.from_decimal(measure.weight)
 
             if not measure.regex:
                 measure.regex = self._make_regex(measure)
         return measures
 
+    def compile(self) -> None:
+        for measure in self.measures:
+            measure.compile()
+
+    def candidates_regex(self) -> str:
+        """
+        Return regex, which matches at every position where any measure matches.
+        The numerical part of the default measures regexes is matched once.
+        """
+        if all(measure.regex == self._make_regex(measure) for measure in self.measures):
+            designations = "|".join(
+                f"(?:{measure.designation})" for measure in self.measures
+            )
+            return f"{self.prefix}{self.numerical_regex}(?:{designations})"
+
+        return "|".join(f"(?:{measure.regex})" for measure in self.measures)
+
     def __iter__(self):
-        while self.__index < len(self.measures):
-            yield self.measures[self.__index]
-            self.__index += 1
+        return iter(self.measures)
 
 
 class StringFeature(AbstractFeature):
@@ -184,6 +291,7 @@ class StringFeature(AbstractFeature):
         self,
         value: str,
         type_: Type,
+        fixed_point: bool = False,
     ) -> None:
         self.original_value = value
         self.standard_value = self._standartization(type_)
@@ -266,9 +374,24 @@ class NumericalFeature(AbstractFeature):
     NOT_FOUND_MODE: FeatureNotFoundMode
     PRIORITY: int = 10
 
-    def __init__(self, value: str, measure: Measure) -> None:
+    _fixed_num = re.compile(r"\d+[.,]?\d*")
+
+    def __init__(
+        self,
+        value: str,
+        measure: Measure,
+        fixed_point: bool = False,
+    ) -> None:
+        """
+        - fixed_point - keep the standard value as integer count of
+        10 ** -FIXED_POINT_SCALE units instead of Decimal
+        """
         self.original_value = value
-        self.standard_value = self._standartization(value, measure)
+        self.scale = self.FIXED_POINT_SCALE if fixed_point else None
+        if fixed_point:
+            self.standard_value = self._fixed_standartization(value, measure)
+        else:
+            self.standard_value = self._standartization(value, measure)
 
     def _standartization(self, value: str, measure: Measure):
         # num_value = re.search(r"\d*[.,]?\d+", value)[0]
@@ -282,6 +405,16 @@ class NumericalFeature(AbstractFeature):
         # TODO: решить, оставить ли Decimal
         return num_value
 
+    def _fixed_standartization(self, value: str, measure: Measure):
+        num_value = FixedPoint.parse(self._fixed_num.search(value)[0])
+        num_value = FixedPoint.multiply(num_value, measure.fixed_weight)
+        return FixedPoint.units(num_value, self.scale)
+
+    def _str_value(self) -> str:
+        if self.scale is None:
+            return str(self.standard_value)
+        return FixedPoint.to_str(self.standard_value, self.scale)
+
     def __eq__(self, other: AbstractFeature) -> bool:
         if isinstance(other, self.__class__):
             if self.standard_value == other.standard_value:
@@ -292,10 +425,10 @@ class NumericalFeature(AbstractFeature):
         return hash(self.standard_value)
 
     def __repr__(self) -> str:
-        return rf"{self.NAME} = {self.standard_value}"
+        return rf"{self.NAME} = {self._str_value()}"
 
     def __str__(self) -> str:
-        return rf"{self.NAME} = {self.standard_value}"
+        return rf"{self.NAME} = {self._str_value()}"
 
     @classmethod
     @property
@@ -453,8 +586,15 @@ class Length(NumericalFeature):
 
 
 class Designation(object):
-    def __init__(self, original_value: str) -> None:
+    _fixed_num = re.compile(r"\d*[.,]?\d+")
+
+    def __init__(self, original_value: str, fixed_point: bool = False) -> None:
+        """
+        - fixed_point - numbers and weights are (mantissa, exponent)
+        pairs and standard value is fixed-point units
+        """
         self.original_value = original_value
+        self.fixed_point = fixed_point
         self.num_value = self._get_num_value(original_value)
 
         self.checked = False
@@ -462,6 +602,8 @@ class Designation(object):
         self.standard_value = self.num_value
 
     def _get_num_value(self, value: str) -> Decimal:
+        if self.fixed_point:
+            return FixedPoint.parse(self._fixed_num.search(value)[0])
         num_value: str = re.search(r"\d*[.,]?\d+", value)[0]
         num_value = Decimal(num_value.replace(",", "."))
         return num_value
@@ -478,6 +620,15 @@ class Designation(object):
             self.standard_value = self.num_value * Decimal(str(potential_weight))
         return self
 
+    def set_fixed_value(self, potential_weight: tuple[int, int], scale: int):
+        """set_standard_value for fixed-point designation"""
+        weight = self.weight if self.have_weight() else potential_weight
+        self.standard_value = FixedPoint.units(
+            FixedPoint.multiply(self.num_value, weight),
+            scale,
+        )
+        return self
+
     def have_weight(self) -> bool:
         if self.weight is None:
             return False
@@ -502,6 +653,10 @@ class Dimension(AbstractFeature):
         (0.01, "см|cm"),
         (1, r"m([^m]|\b)|м([^м]|\b)"),
     ]
+    _fixed_weights = [
+        (FixedPoint.from_decimal(w), re.compile(rx, re.IGNORECASE)) for w, rx in _weights
+    ]
+    _fixed_sep = re.compile(_sep)
 
     MEASURES: FeatureMeasures = FeatureMeasures(
         measures=[
@@ -523,13 +678,18 @@ class Dimension(AbstractFeature):
         self,
         value: str,
         measure: Measure,
+        fixed_point: bool = False,
     ) -> None:
         self.original_value = value
         self.standard_weight = 1
+        self.scale = self.FIXED_POINT_SCALE if fixed_point else None
 
         self.standard_value = self._standartization(value)
 
     def _set_weight(self, designation: Designation) -> Designation:
+        if self.scale is not None:
+            return self._set_fixed_weight(designation)
+
         for weight in self._weights:
             srch = re.search(weight[1], designation.value, re.IGNORECASE)
             if srch:
@@ -538,6 +698,14 @@ class Dimension(AbstractFeature):
 
         return designation
 
+    def _set_fixed_weight(self, designation: Designation) -> Designation:
+        for weight in self._fixed_weights:
+            if weight[1].search(designation.value):
+                designation.set_weight(weight[0])
+                break
+
+        return designation
+
     def _set_value(self, designations: list[Designation]) -> list[Designation]:
         designations_with_weight = [d for d in designations if d.have_weight()]
 
@@ -546,6 +714,14 @@ class Dimension(AbstractFeature):
         else:
             standard_weight = designations_with_weight[-1].weight
 
+        if self.scale is not None:
+            if not designations_with_weight:
+                standard_weight = FixedPoint.from_decimal(standard_weight)
+            return [
+                designation.set_fixed_value(standard_weight, self.scale)
+                for designation in designations
+            ]
+
         designations = [
             designation.set_standard_value(standard_weight)
             for designation in designations
@@ -553,8 +729,13 @@ class Dimension(AbstractFeature):
         return designations
 
     def _standartization(self, value: str) -> set[Decimal]:
-        designations = re.split(self._sep, value, re.IGNORECASE)
-        designations = [Designation(dsgn) for dsgn in designations]
+        if self.scale is not None:
+            # the same split as below (IGNORECASE flag is maxsplit there)
+            designations = self._fixed_sep.split(value, re.IGNORECASE)
+            designations = [Designation(dsgn, True) for dsgn in designations]
+        else:
+            designations = re.split(self._sep, value, re.IGNORECASE)
+            designations = [Designation(dsgn) for dsgn in designations]
         designations = [self._set_weight(designation) for designation in designations]
         designations = self._set_value(designations)
         designations = frozenset([d.standard_value for d in designations])
@@ -569,14 +750,19 @@ class Dimension(AbstractFeature):
     def __hash__(self) -> int:
         return hash(self.standard_value)
 
+    def _str_value(self, value) -> str:
+        if self.scale is None:
+            return str(value)
+        return FixedPoint.to_str(value, self.scale)
+
     def __repr__(self) -> str:
         return "n-размерность = " + "x".join(
-            list([str(v) for v in self.standard_value])
+            list([self._str_value(v) for v in self.standard_value])
         )
 
     def __str__(self) -> str:
         return "n-размерность = " + "x".join(
-            list([str(v) for v in self.standard_value])
+            list([self._str_value(v) for v in self.standard_value])
         )
 
     @classmethod
@@ -603,6 +789,10 @@ class Concentration(AbstractFeature):
         (1, r"мл"),
         (1000, r"л"),
     ]
+    _fixed_tops = [(FixedPoint.from_decimal(w), re.compile(rx)) for w, rx in _tops]
+    _fixed_bots = [(FixedPoint.from_decimal(w), re.compile(rx)) for w, rx in _bots]
+    _fixed_num1 = re.compile(_num1)
+    _fixed_sep = re.compile(_sep)
 
     Numeric_Concentration = Measure(
         "Numeric Concentration",
@@ -634,11 +824,15 @@ class Concentration(AbstractFeature):
         self,
         value: str,
         measure: Measure,
+        fixed_point: bool = False,
     ) -> None:
         self.original_value = value
         self.standard_weight = 1
+        self.scale = self.FIXED_POINT_SCALE if fixed_point else None
 
-        if measure is self.Numeric_Concentration:
+        if fixed_point:
+            self.standard_value = self._fixed_standartization(value, measure)
+        elif measure is self.Numeric_Concentration:
             self.standard_value = self._numerical_standartization(value)
         elif measure is self.Percent_Concentration:
             self.standard_value = self._percent_standartization(value)
@@ -675,6 +869,36 @@ class Concentration(AbstractFeature):
         standard = Decimal(standard) * self.Percent_Concentration.weight
         return standard
 
+    def _fixed_num_standartization(self, value: str, weights: list) -> tuple:
+        num = self._fixed_num1.search(value)
+        num = FixedPoint.parse(num[0]) if num else (1, 0)
+
+        weight = (1, 0)
+        for _weight in weights:
+            if _weight[1].search(value):
+                weight = _weight[0]
+                break
+
+        return FixedPoint.multiply(num, weight)
+
+    def _fixed_standartization(self, value: str, measure: Measure):
+        if measure is self.Percent_Concentration:
+            standard = FixedPoint.parse(self._fixed_num1.search(value)[0])
+            standard = FixedPoint.multiply(standard, measure.fixed_weight)
+            return FixedPoint.units(standard, self.scale)
+
+        top, bot = self._fixed_sep.split(value, re.IGNORECASE)
+        top = self._fixed_num_standartization(top, self._fixed_tops)
+        bot = self._fixed_num_standartization(bot, self._fixed_bots)
+        top = FixedPoint.multiply(top, measure.fixed_weight)
+
+        standard = FixedPoint.divide(top, bot, self.scale)
+        if standard is None:
+            # not representable quotient is rounded as Decimal does
+            standard = self._numerical_standartization(value)
+            standard = FixedPoint.decimal_units(standard, self.scale)
+        return standard
+
     def __eq__(self, other: AbstractFeature) -> bool:
         if isinstance(other, self.__class__):
             if self.standard_value == other.standard_value:
@@ -684,11 +908,16 @@ class Concentration(AbstractFeature):
     def __hash__(self) -> int:
         return hash(self.standard_value)
 
+    def _str_value(self) -> str:
+        if self.scale is None:
+            return str(self.standard_value)
+        return FixedPoint.to_str(self.standard_value, self.scale)
+
     def __repr__(self) -> str:
-        return f"Concentration = {self.standard_value}"
+        return f"Concentration = {self._str_value()}"
 
     def __str__(self) -> str:
-        return f"Concentration = {self.standard_value}"
+        return f"Concentration = {self._str_value()}"
 
     @classmethod
     @property
@@ -704,6 +933,36 @@ class FutureList(object):
         if not future_list:
             future_list = self.default_futures()
         self.future_list = self.sort_futures(future_list)
+        self.compile()
+        self.version = self.make_version()
+
+    def compile(self) -> None:
+        """Compile designations regexes of all futures"""
+        for future in self.future_list:
+            future.designations.compile()
+
+    def make_version(self) -> str:
+        """
+        Version of the futures set, changes with the futures and their
+        designations (used to invalidate the stored search results)
+        """
+        description = [
+            (
+                future.__qualname__,
+                future.NAME,
+                [
+                    (
+                        designation.name,
+                        designation.designation,
+                        designation.regex,
+                        getattr(designation, "weight", None),
+                    )
+                    for designation in future.designations
+                ],
+            )
+            for future in self.future_list
+        ]
+        return hashlib.md5(repr(description).encode()).hexdigest()
 
     def sort_futures(self, future_list: list[AbstractFeature]) -> list[AbstractFeature]:
         futures = [(future, future.PRIORITY) for future in future_list]
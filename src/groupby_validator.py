@@ -71,6 +71,14 @@ class GroupByValidator(object):
                 )
         return df
 
+    def _fill_region(self, data: pd.DataFrame) -> pd.DataFrame:
+        region = data[DATA.REGION]
+        if isinstance(region.dtype, pd.CategoricalDtype):
+            if "" not in region.cat.categories:
+                region = region.cat.add_categories("")
+        data[DATA.REGION] = region.fillna("")
+        return data
+
     def _groupby_goods(self, data: pd.DataFrame, func: Callable) -> pd.DataFrame:
         data = data.groupby(
             by=[
@@ -78,6 +86,7 @@ class GroupByValidator(object):
                 DATA.SOURCE,
                 DATA.REGION,
             ],
+            observed=True,
         ).progress_apply(func, mark=GROUPBY_VALIDATOR.GOODS_MARK)
 
         return data
@@ -88,13 +97,14 @@ class GroupByValidator(object):
                 DATA.LINK,
                 DATA.REGION,
             ],
+            observed=True,
         ).progress_apply(func, mark=GROUPBY_VALIDATOR.LINKS_MARK)
 
         return data
 
     def validate_by_price(self, data: pd.DataFrame) -> pd.DataFrame:
         data[GROUPBY_VALIDATOR.PRICE_VALID] = 90  # by default assumption
-        data[DATA.REGION] = data[DATA.REGION].fillna("")
+        data = self._fill_region(data)
 
         data = self._groupby_goods(data, self._price_func)
         data = self._groupby_links(data, self._price_func)
@@ -112,7 +122,7 @@ class GroupByValidator(object):
         output_column = feature_name + "_groupby_validation"
 
         data[output_column] = 90  # by default assumption
-        data[DATA.REGION] = data[DATA.REGION].fillna("")
+        data = self._fill_region(data)
 
         func = partial(
             self._feature_func,
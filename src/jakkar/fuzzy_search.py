@@ -1,10 +1,19 @@
 import pandas as pd
 from fuzzywuzzy import process as fuzz_process
+from fuzzywuzzy import utils as fuzz_utils
+from fuzzywuzzy import fuzz
+from rapidfuzz import process as rf_process
+from rapidfuzz import fuzz as rf_fuzz
 from tqdm import tqdm
+from collections import Counter
+from functools import partial
+from itertools import count
+from typing import Union
 import warnings
 import multiprocessing
 import numpy as np
 import gc
+import sys
 
 
 warnings.filterwarnings("ignore")
@@ -12,6 +21,17 @@ tqdm.pandas()
 
 
 from tokenization import Token, TokenTransformer
+from cache import BoundedCache
+
+
+def process_query(query: str) -> str:
+    """The same processing of the query as in fuzz_process.extractOne"""
+    return fuzz_utils.full_process(fuzz_utils.full_process(query), force_ascii=True)
+
+
+def process_choice(choice: str) -> str:
+    """The same processing of the choice as in fuzz_process.extractOne"""
+    return fuzz_utils.full_process(choice, force_ascii=True)
 
 
 def old_search_func(
@@ -82,16 +102,192 @@ def setup_tasks(
     return data
 
 
+TokensPayload = tuple[tuple[str, float], ...]
+
+ScoresPayload = dict[tuple[str, str], int]
+
+# FuzzySearch copy living in the pool process (by id of the parallel search),
+# so the cache of the copy is kept between the chunks of the search;
+# copies of the previous searches are dropped
+_worker_searches = {}
+_search_ids = count()
+
+
+def search_chunk(
+    search_id: int,
+    fuzzy: "FuzzySearch",
+    task: tuple[list[tuple[TokensPayload, TokensPayload]], ScoresPayload],
+) -> tuple[list[tuple[TokensPayload, TokensPayload]], int, int, ScoresPayload]:
+    """
+    Fuzzy search over the chunk of rows in the pool process.
+
+    - task - rows of the chunk and scores of the parent cache for them
+    Returns the scores missed in the cache to extend the parent cache.
+    """
+    if search_id not in _worker_searches:
+        _worker_searches.clear()
+        _worker_searches[search_id] = fuzzy
+    fuzzy: FuzzySearch = _worker_searches[search_id]
+
+    chunk, scores = task
+    for key, score in scores.items():
+        fuzzy.cache.set(key, score)
+    hits, misses = fuzzy.cache_hits, fuzzy.cache_misses
+
+    output = [fuzzy._search_payload(row) for row in chunk]
+
+    new_scores, fuzzy._new_scores = fuzzy._new_scores, {}
+    return (
+        output,
+        fuzzy.cache_hits - hits,
+        fuzzy.cache_misses - misses,
+        new_scores,
+    )
+
+
+class FuzzyScorer(object):
+    """
+    Scorers of FuzzySearch:
+    - EXTRACT_ONE - fuzzywuzzy extractOne for every left token
+    - CDIST - rapidfuzz cdist matrix of all left and right tokens of the row
+    (WRatio over the same processed strings, argmax per left token)
+    """
+
+    EXTRACT_ONE = "extract_one"
+    CDIST = "cdist"
+
+
+class FuzzyBlockingIndex(object):
+    """
+    Candidates blocking for FuzzySearch.
+
+    Before scoring, right tokens which can't reach the fuzzy threshold
+    are dropped. The default extractOne scorer (WRatio) is built from
+    ratio and partial_ratio of the processed strings, and both are bounded
+    from above by the count of common characters, so the pruned candidates
+    always have a score below the threshold and the extractOne result
+    (including the first-best order) stays the same.
+
+    Profiles (processed string, length, characters counter) are stored
+    per token value, so the index is shared by all rows of the vocabulary.
+    """
+
+    def __init__(self) -> None:
+        self._query_profiles = {}
+        self._choice_profiles = {}
+
+    def _make_profile(self, processed: str) -> tuple[str, int, Counter]:
+        return processed, len(processed), Counter(processed)
+
+    def _query_profile(self, query: str) -> tuple[str, int, Counter]:
+        profile = self._query_profiles.get(query)
+        if profile is None:
+            profile = self._make_profile(process_query(query))
+            self._query_profiles[query] = profile
+        return profile
+
+    def _choice_profile(self, choice: str) -> tuple[str, int, Counter]:
+        profile = self._choice_profiles.get(choice)
+        if profile is None:
+            profile = self._make_profile(process_choice(choice))
+            self._choice_profiles[choice] = profile
+        return profile
+
+    def _upper_bound(
+        self,
+        query: tuple[str, int, Counter],
+        choice: tuple[str, int, Counter],
+    ) -> float:
+        q_value, q_len, q_counter = query
+        c_value, c_len, c_counter = choice
+
+        if not q_len or not c_len:
+            return 0
+
+        # token based scorers split strings by spaces, keep such pairs as is
+        if " " in q_value or " " in c_value:
+            return 100
+
+        common = sum((q_counter & c_counter).values())
+        short_len = min(q_len, c_len)
+        long_len = max(q_len, c_len)
+
+        bound = 200 * common / (q_len + c_len)
+
+        len_ratio = long_len / short_len
+        if len_ratio >= 1.5:
+            partial_scale = 0.6 if len_ratio > 8 else 0.9
+            partial = 200 * common / (short_len + common) if common else 0
+            bound = max(bound, partial * partial_scale)
+
+        return bound
+
+    def candidates(
+        self,
+        query: str,
+        choices: list[str],
+        fuzzy_threshold: int,
+    ) -> list[str]:
+        """Return choices (in the same order) which can reach the threshold"""
+
+        query_profile = self._query_profile(query)
+
+        # +1 covers two roundings inside WRatio
+        return [
+            choice
+            for choice in choices
+            if self._upper_bound(query_profile, self._choice_profile(choice)) + 1
+            >= fuzzy_threshold
+        ]
+
+
 class FuzzySearch(object):
+    """
+    Fuzzy search of left tokens in right tokens of the same row.
+
+    - fuzzy_threshold - min score of fuzzy matching (0 - 100)
+    - transformer - transformer of the matched tokens
+    - blocking_index - candidates blocking before fuzzy scoring
+    (doesn't change the result)
+    - cache - scores cache of (left token, right token) values pairs,
+    shared by all rows (and runs, if the cache has a path)
+    - chunk_size - count of rows in one task of the process pool
+    - scorer - FuzzyScorer mode (blocking_index and cache are used
+    only by EXTRACT_ONE scorer)
+    """
+
     def __init__(
         self,
         fuzzy_threshold: int,
         transformer: TokenTransformer,
+        blocking_index: Union[FuzzyBlockingIndex, None] = None,
+        cache: Union[BoundedCache, None] = None,
+        chunk_size: int = 1000,
+        scorer: FuzzyScorer = FuzzyScorer.EXTRACT_ONE,
     ) -> None:
         if fuzzy_threshold > 100 or fuzzy_threshold < 0:
             raise ValueError("Fuzzy threshold should be in range 0 to 100")
+        if chunk_size < 1:
+            raise ValueError("Chunk size should be positive")
+        if scorer not in [FuzzyScorer.EXTRACT_ONE, FuzzyScorer.CDIST]:
+            raise NotImplementedError("Not implemented fuzzy scorer")
+
         self.fuzzy_threshold = fuzzy_threshold
         self.transformer = transformer
+        self.blocking_index = blocking_index
+        self.cache = cache
+        self.chunk_size = chunk_size
+        self.scorer = scorer
+        # scores missed in the cache (collected by the pool copies only)
+        self._new_scores = None
+
+    @property
+    def cache_hits(self) -> int:
+        return self.cache.hits if self.cache is not None else 0
+
+    @property
+    def cache_misses(self) -> int:
+        return self.cache.misses if self.cache is not None else 0
 
     def _old_search(
         self,
@@ -154,6 +350,33 @@ class FuzzySearch(object):
 
         return data
 
+    def _score(self, query: str, choice: str) -> int:
+        score = self.cache.get((query, choice))
+        if score is None:
+            score = fuzz.WRatio(
+                process_query(query),
+                process_choice(choice),
+                full_process=False,
+            )
+            self.cache.set((query, choice), score)
+            if self._new_scores is not None:
+                self._new_scores[(query, choice)] = score
+        return score
+
+    def _cached_extract_one(
+        self,
+        query: str,
+        choices: list[str],
+    ) -> Union[tuple[str, int], None]:
+        """The same as fuzz_process.extractOne, but with cached scores"""
+
+        extracted = None
+        for choice in choices:
+            score = self._score(query, choice)
+            if extracted is None or score > extracted[1]:
+                extracted = (choice, score)
+        return extracted
+
     def _fuzz_extract(
         self,
         left_token: Token,
@@ -161,10 +384,23 @@ class FuzzySearch(object):
     ) -> tuple[int, Token]:
         try:
             token_value, score = left_token.value, 0
-            extracted = fuzz_process.extractOne(
-                left_token.value,
-                right_tokens_values,
-            )
+            if self.blocking_index is not None:
+                right_tokens_values = self.blocking_index.candidates(
+                    left_token.value,
+                    right_tokens_values,
+                    self.fuzzy_threshold,
+                )
+
+            if self.cache is not None:
+                extracted = self._cached_extract_one(
+                    left_token.value,
+                    right_tokens_values,
+                )
+            else:
+                extracted = fuzz_process.extractOne(
+                    left_token.value,
+                    right_tokens_values,
+                )
 
             if extracted:
                 token_value, score = extracted
@@ -176,6 +412,32 @@ class FuzzySearch(object):
         finally:
             return token_value, score
 
+    def _cdist_extract(
+        self,
+        left_tokens_values: list[str],
+        right_tokens_values: list[str],
+    ) -> list[tuple[str, int]]:
+        """Best right token for every left token by one scores matrix"""
+
+        if not left_tokens_values or not right_tokens_values:
+            return [(value, 0) for value in left_tokens_values]
+
+        matrix = rf_process.cdist(
+            [process_query(value) for value in left_tokens_values],
+            [process_choice(value) for value in right_tokens_values],
+            scorer=rf_fuzz.WRatio,
+            processor=None,
+        )
+
+        # argmax returns the first best choice, as extractOne does
+        best = matrix.argmax(axis=1)
+        scores = np.rint(matrix[np.arange(len(best)), best]).astype(int)
+
+        return [
+            (right_tokens_values[index], score)
+            for index, score in zip(best.tolist(), scores.tolist())
+        ]
+
     def _search_func(
         self,
         row: list[Token],
@@ -184,6 +446,22 @@ class FuzzySearch(object):
         right_tokens: list[Token] = row[1]
         right_tokens_values = [token.value for token in right_tokens]
 
+        extracted = None
+        if self.scorer == FuzzyScorer.CDIST:
+            # scores depend only on the values, which aren't changed
+            # before the left token is processed, so all of them can be
+            # counted by one matrix before the transformations
+            extracted = iter(
+                self._cdist_extract(
+                    [
+                        token.value
+                        for token in left_tokens
+                        if token not in right_tokens
+                    ],
+                    right_tokens_values,
+                )
+            )
+
         for left_token in left_tokens:
             if left_token in right_tokens:
                 index = right_tokens.index(left_token.value)
@@ -192,7 +470,13 @@ class FuzzySearch(object):
                 self.transformer.transform(right_token, left_token, False)
 
             else:
-                token_value, score = self._fuzz_extract(left_token, right_tokens_values)
+                if extracted is not None:
+                    token_value, score = next(extracted)
+                else:
+                    token_value, score = self._fuzz_extract(
+                        left_token,
+                        right_tokens_values,
+                    )
                 if score >= self.fuzzy_threshold:
                     index = right_tokens.index(token_value)
                     right_token = right_tokens[index]
@@ -201,6 +485,117 @@ class FuzzySearch(object):
 
         return left_tokens, right_tokens
 
+    def _to_payload(self, tokens: list[Token]) -> TokensPayload:
+        return tuple((token.value, token.custom_weight) for token in tokens)
+
+    def _from_payload(self, payload: TokensPayload) -> list[Token]:
+        tokens = []
+        for value, weight in payload:
+            token = Token(value, weight)
+            token.value = sys.intern(value)
+            tokens.append(token)
+        return tokens
+
+    def _search_payload(
+        self,
+        row: tuple[TokensPayload, TokensPayload],
+    ) -> tuple[TokensPayload, TokensPayload]:
+        left_tokens = self._from_payload(row[0])
+        right_tokens = self._from_payload(row[1])
+
+        left_tokens, right_tokens = self._search_func((left_tokens, right_tokens))
+        return self._to_payload(left_tokens), self._to_payload(right_tokens)
+
+    def _apply_payload(self, tokens: list[Token], payload: TokensPayload) -> None:
+        for token, (value, weight) in zip(tokens, payload):
+            if token.value != value:
+                token.value = sys.intern(value)
+            if token.custom_weight != weight:
+                token.change_custom_weight(weight)
+
+    def _worker_copy(self) -> "FuzzySearch":
+        """
+        Light copy for the pool processes: without the collected caches,
+        the scores of the cache are sent with the chunks (_chunk_task)
+        """
+        cache = None
+        if self.cache is not None:
+            cache = BoundedCache(self.cache.max_size)
+
+        blocking_index = None
+        if self.blocking_index is not None:
+            blocking_index = FuzzyBlockingIndex()
+
+        fuzzy = FuzzySearch(
+            self.fuzzy_threshold,
+            self.transformer,
+            blocking_index=blocking_index,
+            cache=cache,
+            chunk_size=self.chunk_size,
+            scorer=self.scorer,
+        )
+        if cache is not None:
+            fuzzy._new_scores = {}
+        return fuzzy
+
+    def _chunk_task(
+        self,
+        chunk: list[tuple[TokensPayload, TokensPayload]],
+    ) -> tuple[list[tuple[TokensPayload, TokensPayload]], ScoresPayload]:
+        """Chunk of rows with the cached scores of their tokens pairs"""
+
+        scores = {}
+        if self.cache is None or self.scorer != FuzzyScorer.EXTRACT_ONE:
+            return chunk, scores
+
+        for left_payload, right_payload in chunk:
+            right_values = {value for value, _ in right_payload}
+            for left_value, _ in left_payload:
+                if left_value in right_values:
+                    continue
+                for right_value in right_values:
+                    key = (left_value, right_value)
+                    score = self.cache.peek(key)
+                    if score is not None:
+                        scores[key] = score
+        return chunk, scores
+
+    def _parallel_search(
+        self,
+        massive: list[tuple[list[Token], list[Token]]],
+        process_pool: multiprocessing.Pool,
+    ) -> list[tuple[list[Token], list[Token]]]:
+        payload = [
+            (self._to_payload(left_tokens), self._to_payload(right_tokens))
+            for left_tokens, right_tokens in massive
+        ]
+        # generator: the tasks are prepared while the pool processes the chunks
+        starts = range(0, len(payload), self.chunk_size)
+        tasks = (
+            self._chunk_task(payload[start : start + self.chunk_size])
+            for start in starts
+        )
+
+        task = partial(search_chunk, next(_search_ids), self._worker_copy())
+        position = 0
+        for output, hits, misses, new_scores in tqdm(
+            process_pool.imap(task, tasks),
+            total=len(starts),
+        ):
+            for left_payload, right_payload in output:
+                left_tokens, right_tokens = massive[position]
+                self._apply_payload(left_tokens, left_payload)
+                self._apply_payload(right_tokens, right_payload)
+                position += 1
+
+            if self.cache is not None:
+                self.cache.hits += hits
+                self.cache.misses += misses
+                for key, score in new_scores.items():
+                    self.cache.set(key, score)
+
+        return massive
+
     def search(
         self,
         data: pd.DataFrame,
@@ -212,7 +607,16 @@ class FuzzySearch(object):
         right_tokens = data[right_tokens_column].to_list()
 
         massive = list(zip(left_tokens, right_tokens))
-        massive = list(map(self._search_func, tqdm(massive)))
+        if process_pool:
+            massive = self._parallel_search(massive, process_pool)
+        else:
+            massive = list(map(self._search_func, tqdm(massive)))
+
+        if self.cache is not None:
+            print("Fuzzy cache:", self.cache.stats)
+            if self.cache.path is not None:
+                self.cache.save()
 
-        data[left_tokens_column, right_tokens_column] = massive
+        data[left_tokens_column] = [row[0] for row in massive]
+        data[right_tokens_column] = [row[1] for row in massive]
         return data
@@ -13,12 +13,21 @@ sys.path.append(str(Path(__file__).parent.parent / "jakkar" / "strmod"))
 
 from notation import JAKKAR, DATA
 from preprocessing import Preprocessor
-from fuzzy_search import FuzzySearch
-from ratio import RateCounter, MarksCounter, MarksMode, RateFunction
+from fuzzy_search import FuzzySearch, FuzzyBlockingIndex, FuzzyScorer
+from ratio import (
+    RateCounter,
+    VectorRateCounter,
+    MarksCounter,
+    SparseMarksCounter,
+    TokenVocabulary,
+    MarksMode,
+    RateFunction,
+)
 from tokenization import (
     BasicTokenizer,
     TokenTransformer,
     RegexTokenizer,
+    SinglePassRegexTokenizer,
     RegexCustomWeights,
     LanguageType,
 )
@@ -35,7 +44,12 @@ class FuzzyJakkarValidator(object):
         marks_counter: MarksCounter,
         debug: bool = False,
         validation_treshold: float = 0.5,
+        deduplicate: bool = True,
     ) -> None:
+        """
+        - deduplicate - process every unique (client, source) pair once
+        and broadcast the results back to all rows of the pair
+        """
         if validation_treshold < 0 or validation_treshold > 1:
             raise ValueError("Validation treshold should be in range 0 - 1")
 
@@ -46,6 +60,8 @@ class FuzzyJakkarValidator(object):
         self.marks_counter = marks_counter
         self.debug = debug
         self.validation_treshold = validation_treshold
+        self.deduplicate = deduplicate
+        self.fixed_ratio = None
 
         self.symbols_to_del = r"'\"/"
         self.returning_columns = [
@@ -83,6 +99,16 @@ class FuzzyJakkarValidator(object):
                 print("End the validation process: save output")
             case "delete_rx":
                 print("Deleting elements from rows by regex")
+            case "deduplicate":
+                print("Deduplicate (client, source) pairs")
+            case "accumulate":
+                print("Accumulate tokens counts")
+            case "fixed_ratio":
+                print("Use ratio of the accumulated tokens counts")
+
+    def _progress_dedup(self, rows: int, pairs: int) -> None:
+        ratio = round(rows / pairs, 2) if pairs else 0
+        print(f"Unique pairs: {pairs} of {rows} rows (dedup ratio {ratio})")
 
     def _delete_symbols(self, series: pd.Series):
         symbols_to_del = "|".join(list(self.symbols_to_del))
@@ -150,12 +176,24 @@ class FuzzyJakkarValidator(object):
         )
         return data
 
+    def _counts_column(self, data: pd.DataFrame) -> str:
+        if JAKKAR.PAIRS_COUNT in data.columns:
+            return JAKKAR.PAIRS_COUNT
+        return None
+
     def _process_ratio(self, data: pd.DataFrame) -> pd.DataFrame:
+        if self.fixed_ratio is not None:
+            self._progress_ind("fixed_ratio")
+            return self.fixed_ratio
+
         self._progress_ind("make_ratio")
+        counts_column = self._counts_column(data)
+
         ratio = self.rate_counter.count_ratio(
             data,
             JAKKAR.CLIENT_TOKENS,
             JAKKAR.SOURCE_TOKENS,
+            counts_column,
         )
         return ratio
 
@@ -163,14 +201,25 @@ class FuzzyJakkarValidator(object):
         self,
         data: pd.DataFrame,
     ) -> pd.DataFrame:
-        return self.marks_counter.count_marks(
+        marks_columns = []
+        data = self.marks_counter.count_marks(
             self.ratio,
             data,
             JAKKAR.CLIENT_TOKENS,
             JAKKAR.SOURCE_TOKENS,
-            self.returning_columns,
+            marks_columns,
         )
 
+        # validator can be called for every chunk of the data
+        self.returning_columns.extend(
+            [
+                column
+                for column in marks_columns
+                if column not in self.returning_columns
+            ]
+        )
+        return data
+
     def _process_tokens_count(
         self,
         data: pd.DataFrame,
@@ -183,13 +232,52 @@ class FuzzyJakkarValidator(object):
         )
         return data
 
-    def validate(
+    def _make_pairs(self, data: pd.DataFrame) -> tuple[pd.DataFrame, np.ndarray]:
+        """Return unique (client, source) pairs and pair code of every row"""
+
+        self._progress_ind("deduplicate")
+        codes = (
+            data.groupby(
+                [JAKKAR.CLIENT, JAKKAR.SOURCE],
+                sort=False,
+                dropna=False,
+            )
+            .ngroup()
+            .to_numpy()
+        )
+        _, first_positions, counts = np.unique(
+            codes,
+            return_index=True,
+            return_counts=True,
+        )
+
+        pairs = data.iloc[first_positions][[JAKKAR.CLIENT, JAKKAR.SOURCE]]
+        pairs = pairs.reset_index(drop=True)
+        pairs[JAKKAR.PAIRS_COUNT] = counts
+
+        self._progress_dedup(len(data), len(pairs))
+        return pairs, codes
+
+    def _broadcast_pairs(
         self,
         data: pd.DataFrame,
-        process_pool: multiprocessing.Pool,
-    ) -> tuple[pd.DataFrame, list[str]]:
-        data = self._create_working_rows(data)
+        pairs: pd.DataFrame,
+        codes: np.ndarray,
+    ) -> pd.DataFrame:
+        columns = [
+            column
+            for column in pairs.columns
+            if column not in [JAKKAR.CLIENT, JAKKAR.SOURCE, JAKKAR.PAIRS_COUNT]
+        ]
+        for column in columns:
+            data[column] = pairs[column].to_numpy()[codes]
+        return data
 
+    def _process_pairs(
+        self,
+        data: pd.DataFrame,
+        process_pool: multiprocessing.Pool,
+    ) -> pd.DataFrame:
         data = self._process_tokenization(data)
         data = self._process_preprocessing(data)
 
@@ -201,6 +289,107 @@ class FuzzyJakkarValidator(object):
         data = self._make_tokens_set(data)
         data = self._process_tokens_count(data)
         data = self._process_marks_count(data)
+        return data
+
+    def accumulate(
+        self,
+        data: pd.DataFrame,
+        process_pool: multiprocessing.Pool,
+    ) -> None:
+        """
+        The first pass of the validation by chunks: tokens of the data chunk
+        are counted for the ratio of all chunks (see fix_ratio), the data
+        isn't changed.
+        """
+        self._progress_ind("accumulate")
+        data = self._create_working_rows(data[[DATA.CLIENT_NAME, DATA.ROW]].copy())
+        if self.deduplicate:
+            data, _ = self._make_pairs(data)
+
+        data = self._process_tokenization(data)
+        data = self._process_preprocessing(data)
+        data = self._process_fuzzy(data, process_pool)
+
+        self.rate_counter.accumulate(
+            data,
+            JAKKAR.CLIENT_TOKENS,
+            JAKKAR.SOURCE_TOKENS,
+            self._counts_column(data),
+        )
+
+    def accumulate_product(
+        self,
+        left: pd.DataFrame,
+        right: pd.DataFrame,
+    ) -> None:
+        """
+        The first pass of the Cartesian product of the client rows (left)
+        and the source rows (right) without its materialization: tokens of
+        every client row are counted len(right) times, tokens of every source
+        row - len(left) times. Fuzzy search depends on the pair, so the
+        tokens are counted before it.
+        """
+        self._progress_ind("accumulate")
+        data = pd.concat(
+            [
+                pd.DataFrame(
+                    {
+                        DATA.CLIENT_NAME: left[DATA.CLIENT_NAME].to_numpy(),
+                        DATA.ROW: "",
+                        JAKKAR.PAIRS_COUNT: len(right),
+                    }
+                ),
+                pd.DataFrame(
+                    {
+                        DATA.CLIENT_NAME: "",
+                        DATA.ROW: right[DATA.ROW].to_numpy(),
+                        JAKKAR.PAIRS_COUNT: len(left),
+                    }
+                ),
+            ],
+            ignore_index=True,
+        )
+        data = self._create_working_rows(data)
+        data = (
+            data.groupby([JAKKAR.CLIENT, JAKKAR.SOURCE], sort=False, dropna=False)[
+                JAKKAR.PAIRS_COUNT
+            ]
+            .sum()
+            .reset_index()
+        )
+
+        data = self._process_tokenization(data)
+        data = self._process_preprocessing(data)
+
+        self.rate_counter.accumulate(
+            data,
+            JAKKAR.CLIENT_TOKENS,
+            JAKKAR.SOURCE_TOKENS,
+            JAKKAR.PAIRS_COUNT,
+        )
+
+    def fix_ratio(self) -> None:
+        """Validate the next chunks with the ratio of the accumulated counts"""
+        self.fixed_ratio = self.rate_counter.accumulated_ratio()
+        self.rate_counter.reset_counts()
+
+    def free_ratio(self) -> None:
+        """Count the ratio of every validated data again"""
+        self.fixed_ratio = None
+
+    def validate(
+        self,
+        data: pd.DataFrame,
+        process_pool: multiprocessing.Pool,
+    ) -> tuple[pd.DataFrame, list[str]]:
+        data = self._create_working_rows(data)
+
+        if self.deduplicate:
+            pairs, codes = self._make_pairs(data)
+            pairs = self._process_pairs(pairs, process_pool)
+            data = self._broadcast_pairs(data, pairs, codes)
+        else:
+            data = self._process_pairs(data, process_pool)
 
         if self.debug:
             self._save_ratio()
@@ -1,6 +1,8 @@
 from abc import ABC, abstractmethod
 import pandas as pd
-from typing import Callable
+import numpy as np
+from scipy import sparse
+from typing import Callable, Iterable
 
 from tokenization import Token
 
@@ -94,6 +96,50 @@ class RateFunction(object):
 
         return value
 
+    @classmethod
+    def _reverse_array(self, values: np.ndarray) -> np.ndarray:
+        reversed_values = np.zeros(len(values), dtype=np.float64)
+        np.divide(1, values, out=reversed_values, where=values != 0)
+        return reversed_values
+
+    @classmethod
+    def _log_array(self, values: np.ndarray, max_value: int) -> np.ndarray:
+        logs = np.zeros(len(values), dtype=np.float64)
+        np.log10(values, out=logs, where=values != 0)
+        return logs
+
+    @classmethod
+    def _parabaloid_array(self, values: np.ndarray, max_value: int) -> np.ndarray:
+        if max_value == 0:
+            return values
+
+        values = values / max_value
+        values = -4 * values**2 + 4 * values
+        return self._reverse_array(values)
+
+    @classmethod
+    def to_array(self, function: Callable) -> Callable:
+        """
+        Return version of the rate function for numpy arrays of values.
+        Custom functions are applied to every value.
+        """
+
+        functions = {
+            self.default: lambda values, max_value: values,
+            self.sqrt2: lambda values, max_value: np.sqrt(values),
+            self.sqrt3: lambda values, max_value: np.power(values, 0.33),
+            self.sqrt4: lambda values, max_value: np.power(values, 0.25),
+            self.log: self._log_array,
+            self.parabaloid: self._parabaloid_array,
+        }
+        if function in functions:
+            return functions[function]
+
+        return lambda values, max_value: np.array(
+            [function(value, max_value) for value in values.tolist()],
+            dtype=np.float64,
+        )
+
 
 class RateCounter(AbstactRateCounter):
     def __init__(
@@ -110,6 +156,8 @@ class RateCounter(AbstactRateCounter):
         self.uniq_penalty = uniq_penalty
         self.rate_function = rate_function
 
+        self.counts = Counter()
+
     def _get_tokens(
         self,
         data: pd.DataFrame,
@@ -160,10 +208,28 @@ class RateCounter(AbstactRateCounter):
 
         return value_rate
 
-    def _process_ratio(self, tokens: list[Token]):
+    def _count_weighted(
+        self,
+        data: pd.DataFrame,
+        left_tokens: str,
+        right_tokens: str,
+        counts_column: str,
+    ) -> Counter:
+        """Count tokens of the rows, which are repeated <counts_column> times"""
+
+        counts = Counter()
+        rows_counts = data[counts_column].to_list()
+        for column in [left_tokens, right_tokens]:
+            for tokens, row_count in zip(data[column].to_list(), rows_counts):
+                for token in tokens:
+                    counts[token.value] += row_count
+        return counts
+
+    def _process_ratio(self, tokens: list[Token], counts: Counter = None):
         ratio = {}
-        tokens_values = [token.value for token in tokens]
-        counts = Counter(tokens_values)
+        if counts is None:
+            tokens_values = [token.value for token in tokens]
+            counts = Counter(tokens_values)
         max_value = counts.most_common()[0][1]
 
         for key, value in counts.items():
@@ -177,11 +243,56 @@ class RateCounter(AbstactRateCounter):
         data: pd.DataFrame,
         left_tokens: str,
         right_tokens: str,
+        counts_column: str = None,
     ) -> dict:
+        """
+        - counts_column - column with count of repeats of the row
+        (for deduplicated data), every row is counted once if not passed
+        """
+        if counts_column is not None:
+            counts = self._count_weighted(
+                data,
+                left_tokens,
+                right_tokens,
+                counts_column,
+            )
+            return self._process_ratio([], counts)
+
         tokens = self._get_tokens(data, left_tokens, right_tokens)
         ratio = self._process_ratio(tokens)
         return ratio
 
+    def accumulate(
+        self,
+        data: pd.DataFrame,
+        left_tokens: str,
+        right_tokens: str,
+        counts_column: str = None,
+    ) -> None:
+        """
+        Add tokens counts of the data chunk to the counts of the previous
+        chunks: the ratio of all chunks is returned by accumulated_ratio
+        """
+        if counts_column is not None:
+            counts = self._count_weighted(
+                data,
+                left_tokens,
+                right_tokens,
+                counts_column,
+            )
+        else:
+            tokens = self._get_tokens(data, left_tokens, right_tokens)
+            counts = Counter([token.value for token in tokens])
+        self.counts.update(counts)
+
+    def accumulated_ratio(self) -> dict:
+        if not self.counts:
+            return {}
+        return self._process_ratio([], self.counts)
+
+    def reset_counts(self) -> None:
+        self.counts = Counter()
+
 
 class AbstractMarksCounter(ABC):
     def __init__(self) -> None:
@@ -322,6 +433,258 @@ class MarksCounter(AbstractMarksCounter):
         return data
 
 
+class TokenVocabulary(object):
+    """Integer ids of the token values"""
+
+    def __init__(self) -> None:
+        self.ids: dict[str, int] = {}
+        self.values: list[str] = []
+
+    def get_id(self, value: str) -> int:
+        token_id = self.ids.get(value)
+        if token_id is None:
+            token_id = len(self.values)
+            self.ids[value] = token_id
+            self.values.append(value)
+        return token_id
+
+    def get_ids(self, values: Iterable[str], count: int = -1) -> np.ndarray:
+        """- count - count of the values (if known)"""
+
+        return np.fromiter(
+            (self.get_id(value) for value in values),
+            dtype=np.int64,
+            count=count,
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class VectorRateCounter(RateCounter):
+    """
+    The same ratio as RateCounter, but counted by numpy arrays:
+    token values are factorized once and counted by their codes.
+
+    - vocabulary - token ids vocabulary, shared between runs
+    """
+
+    def __init__(
+        self,
+        min_ratio: float = 0,
+        max_ratio: float = 1,
+        uniq_max_value: int = 1,
+        uniq_penalty: float = 0,
+        rate_function: Callable = RateFunction.default,
+        vocabulary: TokenVocabulary = None,
+    ) -> None:
+        super().__init__(
+            min_ratio,
+            max_ratio,
+            uniq_max_value,
+            uniq_penalty,
+            rate_function,
+        )
+        self.vocabulary = vocabulary if vocabulary is not None else TokenVocabulary()
+        self.ids_counts = np.zeros(0, dtype=np.int64)
+
+    def _count_ids(
+        self,
+        data: pd.DataFrame,
+        left_tokens: str,
+        right_tokens: str,
+        counts_column: str = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Return token ids in order of appearance and their counts"""
+
+        columns = [data[left_tokens].to_list(), data[right_tokens].to_list()]
+        values = [token.value for column in columns for row in column for token in row]
+        codes, uniques = pd.factorize(np.array(values, dtype=object))
+
+        weights = None
+        if counts_column is not None:
+            lengths = [len(row) for column in columns for row in column]
+            rows_counts = data[counts_column].to_numpy(dtype=np.float64)
+            weights = np.repeat(np.tile(rows_counts, 2), lengths)
+
+        counts = np.bincount(codes, weights=weights, minlength=len(uniques))
+        ids = self.vocabulary.get_ids(uniques, len(uniques))
+        return ids, counts.astype(np.int64)
+
+    def _count_rates(self, counts: np.ndarray) -> np.ndarray:
+        values = counts
+        if callable(self.rate_function):
+            rate_function = RateFunction.to_array(self.rate_function)
+            values = rate_function(counts, int(counts.max()))
+        rates = RateFunction._reverse_array(np.asarray(values, dtype=np.float64))
+
+        rates = np.clip(rates, self.min_ratio, self.max_ratio)
+        if self.uniq_max_value:
+            rates *= np.where(counts <= self.uniq_max_value, self.uniq_penalty, 1)
+        return rates
+
+    def count_ratio(
+        self,
+        data: pd.DataFrame,
+        left_tokens: str,
+        right_tokens: str,
+        counts_column: str = None,
+    ) -> dict:
+        """
+        - counts_column - column with count of repeats of the row
+        (for deduplicated data), every row is counted once if not passed
+        """
+        ids, counts = self._count_ids(data, left_tokens, right_tokens, counts_column)
+        if not len(ids):
+            return {}
+
+        rates = self._count_rates(counts)
+        values = self.vocabulary.values
+        return dict(zip([values[token_id] for token_id in ids], rates.tolist()))
+
+    def accumulate(
+        self,
+        data: pd.DataFrame,
+        left_tokens: str,
+        right_tokens: str,
+        counts_column: str = None,
+    ) -> None:
+        """Counts of the chunks are summed up by the token ids"""
+
+        ids, counts = self._count_ids(data, left_tokens, right_tokens, counts_column)
+        if len(self.ids_counts) < len(self.vocabulary):
+            self.ids_counts = np.concatenate(
+                [
+                    self.ids_counts,
+                    np.zeros(len(self.vocabulary) - len(self.ids_counts), np.int64),
+                ]
+            )
+        np.add.at(self.ids_counts, ids, counts)
+
+    def accumulated_ratio(self) -> dict:
+        ids = np.flatnonzero(self.ids_counts)
+        if not len(ids):
+            return {}
+
+        rates = self._count_rates(self.ids_counts[ids])
+        values = self.vocabulary.values
+        return dict(zip([values[token_id] for token_id in ids], rates.tolist()))
+
+    def reset_counts(self) -> None:
+        self.ids_counts = np.zeros(0, dtype=np.int64)
+
+
+class SparseMarksCounter(MarksCounter):
+    """
+    The same marks as MarksCounter, but counted for all rows at once.
+
+    Tokens sets of the rows are represented as sparse matrices
+    (rows x vocabulary ids) of the tokens rates (ratio * custom weight).
+
+    - vocabulary - token ids vocabulary, shared between runs
+    """
+
+    def __init__(
+        self,
+        mode: MarksMode,
+        vocabulary: TokenVocabulary = None,
+    ) -> None:
+        super().__init__(mode)
+        self.vocabulary = vocabulary if vocabulary is not None else TokenVocabulary()
+
+    def _make_matrix(self, tokens: pd.Series) -> tuple[sparse.csr_matrix, np.ndarray]:
+        """Return rates matrix and tokens count of every row"""
+
+        lengths = tokens.apply(len).to_numpy(dtype=np.int64)
+        values = [token.value for row in tokens for token in row]
+        rates = np.fromiter(
+            (
+                self.ratio[token.value] * token.custom_weight
+                for row in tokens
+                for token in row
+            ),
+            dtype=np.float64,
+            count=len(values),
+        )
+
+        indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        matrix = sparse.csr_matrix(
+            (rates, self.vocabulary.get_ids(values, len(values)), indptr),
+            shape=(len(lengths), len(self.vocabulary)),
+        )
+        return matrix, lengths
+
+    def _presence(self, matrix: sparse.csr_matrix) -> sparse.csr_matrix:
+        # rates can be 0, so the presence is taken from the matrix structure
+        return sparse.csr_matrix(
+            (np.ones_like(matrix.data), matrix.indices, matrix.indptr),
+            shape=matrix.shape,
+        )
+
+    def _rows_sum(self, matrix: sparse.csr_matrix) -> np.ndarray:
+        return np.asarray(matrix.sum(axis=1)).ravel()
+
+    def _divide(self, intersect: np.ndarray, base: np.ndarray) -> np.ndarray:
+        marks = np.zeros(len(base), dtype=np.float64)
+        np.divide(intersect, base, out=marks, where=base != 0)
+        return marks
+
+    def _count_sparse_marks(
+        self,
+        data: pd.DataFrame,
+        left_tokens_column: str,
+        right_tokens_column: str,
+    ) -> dict[str, np.ndarray]:
+        left, left_lengths = self._make_matrix(data[left_tokens_column])
+        right, right_lengths = self._make_matrix(data[right_tokens_column])
+
+        # the left matrix doesn't have the ids added by the right tokens
+        shape = (len(data), len(self.vocabulary))
+        left.resize(shape)
+
+        left_in_right = self._rows_sum(left.multiply(self._presence(right)))
+        right_in_left = self._rows_sum(right.multiply(self._presence(left)))
+        left_sum = self._rows_sum(left)
+        right_sum = self._rows_sum(right)
+
+        # set.intersection keeps the tokens of the smaller set
+        # (of the right one, if the sets have the same size)
+        intersect = np.where(left_lengths < right_lengths, left_in_right, right_in_left)
+        # set.union keeps the left tokens and adds only new right tokens
+        union = left_sum + (right_sum - right_in_left)
+
+        return {
+            MarksMode.UNION: self._divide(intersect, union),
+            MarksMode.CLIENT: self._divide(intersect, left_sum),
+            MarksMode.SOURCE: self._divide(intersect, right_sum),
+        }
+
+    def count_marks(
+        self,
+        ratio: dict,
+        data: pd.DataFrame,
+        left_tokens_column: str,
+        right_tokens_column: str,
+        returning_columns: list[str],
+    ) -> pd.Series:
+        self.ratio = ratio
+
+        marks = self._count_sparse_marks(data, left_tokens_column, right_tokens_column)
+        if self.mode is MarksMode.MULTIPLE:
+            columns = [MarksMode.UNION, MarksMode.CLIENT, MarksMode.SOURCE]
+        elif self.mode in marks:
+            columns = [self.mode]
+        else:
+            raise NotImplementedError("Not implemented Marks Mode")
+
+        for column in columns:
+            data[column] = marks[column]
+        returning_columns.extend(columns)
+
+        return data
+
+
 if __name__ == "__main__":
     val = 0
     print(RateFunction.sqrt2(val))
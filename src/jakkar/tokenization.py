@@ -1,16 +1,24 @@
 from abc import ABC, abstractmethod
+import re
+import sys
 import pandas as pd
 from nltk.tokenize import word_tokenize
 from collections import namedtuple
 from typing import Union
 
 from strmod.word_extraction import *
-from strmod.word_extraction_funcs import LanguageType
+from strmod.word_extraction_funcs import LanguageType, _select_mode
+from cache import BoundedCache
 
 WeightsRules = namedtuple("WeightRule", ["rules", "weight"])
 
+# tokens of the string as (original value, custom weight) pairs
+TokensPayload = tuple[tuple[str, float], ...]
+
 
 class AbstractToken(ABC):
+    __slots__ = ()
+
     def __init__(
         self,
         value: str,
@@ -37,15 +45,20 @@ class Token(AbstractToken):
 
     - value - string value (word)
     - custom_weight - custom weight of this word (don't use manual)
+
+    Tokens are created for every word of every row, so the token is slotted
+    and its values are interned (equal words share one string object).
     """
 
+    __slots__ = ("original_value", "value", "_custom_weight")
+
     def __init__(
         self,
         value: str,
         custom_weight: float = -1,
     ) -> None:
-        self.original_value = str(value)
-        self.value = self.original_value.lower()
+        self.original_value = sys.intern(str(value))
+        self.value = sys.intern(self.original_value.lower())
         self._custom_weight = custom_weight
 
     @property
@@ -222,13 +235,25 @@ class RegexCustomWeights(object):
 
 
 class RegexTokenizer(BasicTokenizer):
+    """
+    This class perform token's extraction by LanguageRules
+
+    - languages - languages of the tokens with their weights
+    - weights_rules - config and weights of the extraction rules
+    - cache - tokens cache of the strings, shared by all columns
+    (and runs, if the cache has a path).
+    The cache should be used with one tokenizer config only.
+    """
+
     def __init__(
         self,
         languages: dict[LanguageType, int],
         weights_rules: RegexCustomWeights,
+        cache: Union[BoundedCache, None] = None,
     ) -> None:
         self.languages = languages
         self.weights_rules = weights_rules.get_rules()
+        self.cache = cache
 
     def create_tokens(
         self,
@@ -251,7 +276,7 @@ class RegexTokenizer(BasicTokenizer):
         data[token_col_name] = data[token_col_name] + tokens
         return data
 
-    def tokenize(
+    def _extract_tokens(
         self,
         data: pd.DataFrame,
         col: str,
@@ -283,3 +308,129 @@ class RegexTokenizer(BasicTokenizer):
                 data = data.drop(weights_rule["rule_name"], axis=1)
 
         return data
+
+    def _tokenize_values(self, values: list[str]) -> list[TokensPayload]:
+        """Return tokens of every value"""
+
+        data = pd.DataFrame({"value": values})
+        data = self._extract_tokens(data, "value", "tokens")
+        return [
+            tuple((token.original_value, token._custom_weight) for token in tokens)
+            for tokens in data["tokens"]
+        ]
+
+    def _get_payloads(self, values: list[str]) -> list[TokensPayload]:
+        if self.cache is None:
+            return self._tokenize_values(values)
+
+        payloads = [self.cache.get(value) for value in values]
+        missed = [index for index, payload in enumerate(payloads) if payload is None]
+        if missed:
+            missed_payloads = self._tokenize_values([values[index] for index in missed])
+            for index, payload in zip(missed, missed_payloads):
+                payloads[index] = payload
+                self.cache.set(values[index], payload)
+
+        return payloads
+
+    def tokenize(
+        self,
+        data: pd.DataFrame,
+        col: str,
+        token_column_name: str,
+    ) -> pd.DataFrame:
+        """
+        Return the dataframe with extra column <token_column_name>.
+        Every unique value of the column is tokenized once.
+        """
+
+        codes, values = pd.factorize(data[col], use_na_sentinel=False)
+        payloads = self._get_payloads(list(values))
+
+        # tokens are changed by fuzzy search, so every row gets its own tokens
+        data[token_column_name] = [
+            [Token(value, weight) for value, weight in payloads[code]]
+            for code in codes
+        ]
+
+        if self.cache is not None:
+            print("Tokens cache:", self.cache.stats)
+            if self.cache.path is not None:
+                self.cache.save()
+
+        return data
+
+
+class SinglePassRegexTokenizer(RegexTokenizer):
+    """
+    The same tokens as RegexTokenizer, but extracted by one regex pass.
+
+    Every word is matched by the combined regex of all languages and rules
+    and gets into the first suitable language -> rule bucket, like the
+    recursive extraction with deletion does.
+    Supports only the default word boundary without extra symbols.
+    """
+
+    def __init__(
+        self,
+        languages: dict[LanguageType, int],
+        weights_rules: RegexCustomWeights,
+        cache: Union[BoundedCache, None] = None,
+    ) -> None:
+        super().__init__(languages, weights_rules, cache)
+        self._check_rules()
+        self._compile()
+
+    def _check_rules(self) -> None:
+        for weights_rule in self.weights_rules.values():
+            rules = weights_rule.rules
+            if (
+                rules.get("symbols")
+                or rules.get("custom_boundary")
+                or not rules.get("word_boundary")
+            ):
+                raise NotImplementedError(
+                    "Single pass tokenization supports only word boundary without symbols"
+                )
+
+    def _compile(self) -> None:
+        # bucket = (tokens weight, letters regex for check_letters or None)
+        self._buckets = []
+        patterns = []
+        for language in self.languages:
+            language_weight = self.languages[language]
+            for weights_rule in self.weights_rules.values():
+                rules = LanguageRules(language, **weights_rule.rules)
+
+                letters = None
+                if rules.check_letters:
+                    letters = re.compile(f"[{rules.language.get_letters()}]")
+
+                self._buckets.append((weights_rule.weight * language_weight, letters))
+                patterns.append(f"({_select_mode(rules)})")
+
+        self._regex = None
+        if patterns:
+            self._regex = re.compile(r"\b(?:" + "|".join(patterns) + r")\b")
+
+    def _tokenize_value(self, value: str) -> TokensPayload:
+        if self._regex is None:
+            return ()
+
+        buckets = [[] for _ in self._buckets]
+        for match in self._regex.finditer(str(value)):
+            index = match.lastindex - 1
+            word = match.group(match.lastindex)
+
+            letters = self._buckets[index][1]
+            if letters is None or letters.search(word.lower()):
+                buckets[index].append(word)
+
+        return tuple(
+            (word, self._buckets[index][0])
+            for index, words in enumerate(buckets)
+            for word in words
+        )
+
+    def _tokenize_values(self, values: list[str]) -> list[TokensPayload]:
+        return [self._tokenize_value(value) for value in values]
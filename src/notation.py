@@ -76,6 +76,7 @@ class DATA(NOTATION):
     def rename(self):
         return {
             RAW.NAME: self.SOURCE_NAME,
+            SEMANTIC.NAME: self.NAME,
             SEMANTIC.CLIENT_NAME: self.CLIENT_NAME,
         }
 
@@ -107,6 +108,23 @@ class DATA(NOTATION):
             self.VC,
         ]
 
+    @classmethod
+    @property
+    def validation_cols(self):
+        """Columns of the validation file (loaded if exist)"""
+        return self.columns_order + [
+            self.SOURCE,
+            self.REGION,
+            self.CLIENT_PRICE,
+            self.SOURCE_PRICE,
+            self.MYMARK,
+        ]
+
+    @classmethod
+    @property
+    def category_cols(self):
+        return [RAW.QUERY, self.QUERY, self.SOURCE, self.REGION]
+
 
 class VENDOR_CODE(NOTATION):
     """Vendor code notations"""
@@ -156,6 +174,17 @@ class FEATURES(NOTATION):
     VALIDATED = "TF validation"
     NOT_FOUND = "TF not found"
 
+    CACHE_PATH = "features_cache.pkl"
+    CACHE_STATS = "features_cache_stats"
+    CASCADE_STATS_PATH = "features_cascade_stats.json"
+
+    # long features table
+    ROW_ID = "row_id"
+    SIDE = "side"
+    FEATURE_ID = "feature_id"
+    VALUE = "standard_value"
+    FEATURE = "feature"
+
     @classmethod
     @property
     def DECISIVE(self):
@@ -173,13 +202,25 @@ class JAKKAR(NOTATION):
     CLIENT_TOKENS = "_client_tokens"
     SOURCE_TOKENS = "_source_tokens"
 
+    PAIRS_COUNT = "_pairs_count"
+
     CLIENT_TOKENS_COUNT = "client_tokens_count"
     SOURCE_TOKENS_COUNT = "source_tokens_count"
 
     RATIO_PATH = r"ratio.xlsx"
+    FUZZY_CACHE_PATH = r"fuzzy_cache.pkl"
+    TOKENS_CACHE_PATH = r"tokens_cache.pkl"
     VALIDATED = "FJ validation"
 
 
+class CANDIDATES(NOTATION):
+    SITE_TOKENS = "_site_tokens"
+    SEMANTIC_TOKENS = "_semantic_tokens"
+    SITE_POSITION = "_site_position"
+    SEMANTIC_POSITION = "_semantic_position"
+    BRAND = "_brand"
+
+
 class GROUPBY_VALIDATOR(NOTATION):
     PRICE_VALID = "price_groupby_validation"
     PRICE_DIFF = "price_diff"
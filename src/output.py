@@ -0,0 +1,342 @@
+import sys
+import time
+import pandas as pd
+from pathlib import Path
+from typing import Union
+
+sys.path.append(str(Path(__file__).parent))
+sys.path.append(str(Path(__file__).parent / "jakkar"))
+sys.path.append(str(Path(__file__).parent / "jakkar" / "strmod"))
+
+from util import DataFormat, _str_objects
+from tokenization import AbstractToken
+
+
+LIST_SEPARATOR = "; "
+
+# limits of the xlsx sheet
+EXCEL_MAX_ROWS = 1_048_576
+EXCEL_MAX_CELL = 32_767
+
+# rows kept until the types of all-null columns are known (parquet, feather)
+ARROW_PENDING_ROWS = 100_000
+
+
+class ListMode(object):
+    """
+    How list columns (tokens sets, features lists) are written.
+
+    - JOINED - string of the values joined by LIST_SEPARATOR
+    - ARROW - arrow list of strings (parquet and feather only,
+    other formats are JOINED)
+    """
+
+    JOINED = "joined"
+    ARROW = "arrow"
+
+
+def _item_str(item) -> str:
+    if isinstance(item, AbstractToken):
+        return item.value
+    return str(item)
+
+
+def _list_values(value) -> Union[list[str], None]:
+    if not isinstance(value, (list, tuple, set, frozenset)):
+        return None if pd.isna(value) else [str(value)]
+
+    values = [_item_str(item) for item in value]
+    # sets have no order, sorted values are the same for every run
+    return sorted(values) if isinstance(value, (set, frozenset)) else values
+
+
+def _is_list_column(column: pd.Series) -> bool:
+    if column.dtype != object:
+        return False
+
+    values = column.dropna()
+    return bool(len(values)) and isinstance(
+        values.iloc[0],
+        (list, tuple, set, frozenset),
+    )
+
+
+def serialize_lists(
+    data: pd.DataFrame,
+    list_mode: str = ListMode.JOINED,
+) -> pd.DataFrame:
+    """
+    Replace objects of the list columns by their values: Token by its value,
+    feature by its string (e.g. "Weight = 500"). Other object columns are
+    written as strings.
+    """
+    data = data.copy()
+
+    list_columns = []
+    for column in data.columns:
+        if not _is_list_column(data[column]):
+            continue
+
+        values = [_list_values(value) for value in data[column]]
+        if list_mode == ListMode.JOINED:
+            values = [
+                None if value is None else LIST_SEPARATOR.join(value)
+                for value in values
+            ]
+        else:
+            list_columns.append(column)
+        data[column] = values
+
+    if not list_columns:
+        return _str_objects(data)
+
+    strings = _str_objects(data.drop(columns=list_columns))
+    data[strings.columns] = strings
+    return data
+
+
+def _arrow_type(values: pd.Series):
+    """
+    Arrow type of the serialized column by its kind, not by its values:
+    string for object columns, list of strings for list columns (ARROW),
+    null for all-null columns (the type isn't known yet)
+    """
+    import pyarrow
+
+    if values.isna().all():
+        return pyarrow.null()
+    if _is_list_column(values):
+        return pyarrow.list_(pyarrow.string())
+    if values.dtype == object or isinstance(values.dtype, pd.CategoricalDtype):
+        return pyarrow.string()
+    return pyarrow.Array.from_pandas(values.iloc[:0]).type
+
+
+def _promote_type(left, right):
+    """Type of the column, which has both types in the different chunks"""
+    import pyarrow
+
+    if left == right or pyarrow.types.is_null(right):
+        return left
+    if pyarrow.types.is_null(left):
+        return right
+
+    def numeric(type_) -> bool:
+        return pyarrow.types.is_integer(type_) or pyarrow.types.is_floating(type_)
+
+    if numeric(left) and numeric(right):
+        return pyarrow.float64()
+    return pyarrow.string()
+
+
+class OutputWriter(object):
+    """
+    Write data chunks to the output file, the format is selected
+    by the extension (DataFormat), so the whole output isn't kept in memory.
+    Timings of the serialization and the writing are summed up
+    in timings and printed on close.
+
+    - path - output file (csv, parquet, feather or xlsx)
+    - list_mode - how list columns are written (ListMode)
+
+    xlsx is written by the write only workbook (rows are streamed to the
+    file); rows over the sheet limit are written to the next sheets.
+    parquet and feather schema is made by the kinds of the columns
+    (_arrow_type), all-null columns get the type of the next chunks
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        list_mode: str = ListMode.JOINED,
+    ) -> None:
+        if list_mode not in [ListMode.JOINED, ListMode.ARROW]:
+            raise ValueError(f"Unknown list mode {list_mode}")
+
+        self.path = path
+        self.data_format = DataFormat.from_path(path)
+        self.list_mode = list_mode
+        if self.data_format in [DataFormat.CSV, DataFormat.EXCEL]:
+            self.list_mode = ListMode.JOINED
+
+        self.rows = 0
+        self.timings = {"serialize": 0.0, "write": 0.0, "close": 0.0}
+
+        self._writer = None
+        self._types = None
+        self._schema = None
+        self._pending = []
+        self._sheet = None
+        self._sheet_rows = 0
+        self._columns = None
+        self._closed = False
+
+    def write(self, data: pd.DataFrame) -> None:
+        start = time.perf_counter()
+        data = serialize_lists(data, self.list_mode)
+        self.timings["serialize"] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        match self.data_format:
+            case DataFormat.CSV:
+                data.to_csv(
+                    self.path,
+                    mode="a" if self.rows else "w",
+                    header=not self.rows,
+                    index=False,
+                )
+            case DataFormat.PARQUET | DataFormat.FEATHER:
+                self._write_arrow(data)
+            case DataFormat.EXCEL:
+                self._write_excel(data)
+        self.timings["write"] += time.perf_counter() - start
+
+        self.rows += len(data)
+
+    def _arrow_table(self, data: pd.DataFrame, schema):
+        import pyarrow
+
+        arrays = []
+        for field in schema:
+            values = data[field.name]
+            if values.isna().all():
+                arrays.append(pyarrow.nulls(len(values), field.type))
+                continue
+
+            if pyarrow.types.is_string(field.type) and _is_list_column(values):
+                # the type was fixed before the first lists (ARROW_PENDING_ROWS)
+                values = pd.Series(
+                    [
+                        None if value is None else LIST_SEPARATOR.join(value)
+                        for value in values
+                    ]
+                )
+            elif pyarrow.types.is_string(field.type) and values.dtype != object:
+                values = values.astype(object)
+                values = values.where(values.isna(), values.astype(str))
+            arrays.append(pyarrow.array(values, type=field.type, from_pandas=True))
+        return pyarrow.Table.from_arrays(arrays, schema=schema)
+
+    def _open_arrow(self) -> None:
+        """
+        Open the file with the types of the pending chunks,
+        columns without the known type are strings
+        """
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+
+        self._schema = pyarrow.schema(
+            [
+                (column, pyarrow.string() if pyarrow.types.is_null(type_) else type_)
+                for column, type_ in self._types.items()
+            ]
+        )
+        if self.data_format == DataFormat.PARQUET:
+            self._writer = pyarrow.parquet.ParquetWriter(self.path, self._schema)
+        else:
+            self._writer = pyarrow.ipc.new_file(str(self.path), self._schema)
+
+        pending, self._pending = self._pending, []
+        for data in pending:
+            self._writer.write_table(self._arrow_table(data, self._schema))
+
+    def _write_arrow(self, data: pd.DataFrame) -> None:
+        """
+        The file schema can't be changed, so the chunks are kept until
+        every column has the type (or ARROW_PENDING_ROWS are kept):
+        e.g. the first chunks can be empty or have all-null columns
+        """
+        import pyarrow
+
+        if self._writer is not None:
+            self._writer.write_table(self._arrow_table(data, self._schema))
+            return
+
+        if self._types is None:
+            self._types = {column: pyarrow.null() for column in data.columns}
+        for column in data.columns:
+            self._types[column] = _promote_type(
+                self._types[column],
+                _arrow_type(data[column]),
+            )
+        self._pending.append(data)
+
+        known = not any(pyarrow.types.is_null(type_) for type_ in self._types.values())
+        if known or sum(len(data) for data in self._pending) >= ARROW_PENDING_ROWS:
+            self._open_arrow()
+
+    def _excel_sheet(self) -> None:
+        import openpyxl
+
+        if self._writer is None:
+            self._writer = openpyxl.Workbook(write_only=True)
+
+        self._sheet = self._writer.create_sheet()
+        self._sheet.append(self._columns)
+        self._sheet_rows = 1
+
+    def _write_excel(self, data: pd.DataFrame) -> None:
+        from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+        if self._columns is None:
+            self._columns = [str(column) for column in data.columns]
+            self._excel_sheet()
+
+        def cell(value):
+            if isinstance(value, str):
+                return ILLEGAL_CHARACTERS_RE.sub("", value)[:EXCEL_MAX_CELL]
+            return value
+
+        data = data.astype(object).where(data.notna(), None)
+        for row in data.itertuples(index=False, name=None):
+            if self._sheet_rows == EXCEL_MAX_ROWS:
+                self._excel_sheet()
+            self._sheet.append([cell(value) for value in row])
+            self._sheet_rows += 1
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+
+        start = time.perf_counter()
+        if self.data_format == DataFormat.EXCEL:
+            if self._writer is None:
+                # empty output still has a sheet
+                self._columns = []
+                self._excel_sheet()
+            self._writer.save(self.path)
+            self._writer.close()
+        elif self.data_format in [DataFormat.PARQUET, DataFormat.FEATHER]:
+            if self._writer is None and self._types is not None:
+                self._open_arrow()
+            if self._writer is not None:
+                self._writer.close()
+        self._writer = None
+        self.timings["close"] += time.perf_counter() - start
+
+        timings = ", ".join(
+            f"{stage} {round(seconds, 2)} s" for stage, seconds in self.timings.items()
+        )
+        print(f"OUTPUT {self.path}: {self.rows} ROWS, {timings}")
+
+
+def write_data(
+    data: pd.DataFrame,
+    path: Union[str, Path],
+    list_mode: str = ListMode.JOINED,
+    chunk_size: int = 100_000,
+) -> OutputWriter:
+    """Write the whole data to the output file by chunks of chunk_size rows"""
+    if chunk_size <= 0:
+        raise ValueError("Chunk size should be positive")
+
+    writer = OutputWriter(path, list_mode)
+    try:
+        # empty data is written too (header of the columns)
+        for start in range(0, max(len(data), 1), chunk_size):
+            writer.write(data.iloc[start : start + chunk_size])
+    finally:
+        writer.close()
+    return writer
@@ -0,0 +1,31 @@
+from pathlib import Path
+import sys
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from cache import BoundedCache
+
+
+def test_bounded_cache_lru():
+    cache = BoundedCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+
+    assert cache.get("a") == 1  # "b" becomes the least recently used
+    cache.set("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert cache.stats == {"hits": 2, "misses": 1, "size": 2, "hit_rate": 0.6667}
+
+
+def test_bounded_cache_versions(tmp_path):
+    path = tmp_path / "cache.pkl"
+
+    cache = BoundedCache(path=path, version="1")
+    cache.set("a", 1)
+    cache.save()
+
+    assert BoundedCache(path=path, version="1").get("a") == 1
+    assert BoundedCache(path=path, version="2").get("a") is None
@@ -0,0 +1,167 @@
+from pathlib import Path
+import sys
+import pytest
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from candidates import CandidateGenerator
+from util import DataRepr, DataReprMode, LazyDecart
+from text_feature import TextFeatureSearch
+from features_collection import Weight, Volume
+from jakkar.jakkar import (
+    FuzzyJakkarValidator,
+    RegexTokenizer,
+    RegexCustomWeights,
+    LanguageType,
+    Preprocessor,
+    FuzzySearch,
+    TokenTransformer,
+    VectorRateCounter,
+    RateFunction,
+    MarksCounter,
+    MarksMode,
+)
+from notation import DATA, RAW, SEMANTIC, JAKKAR
+
+
+def make_generator(**kwargs) -> CandidateGenerator:
+    return CandidateGenerator(
+        tokenizer=RegexTokenizer(
+            {LanguageType.RUS: 1, LanguageType.ENG: 1},
+            weights_rules=RegexCustomWeights(1, 1, 1, 1),
+        ),
+        rate_counter=VectorRateCounter(0, 1, 1, 0, RateFunction.sqrt2),
+        **kwargs,
+    )
+
+
+def make_decart(tmp_path) -> LazyDecart:
+    semantic = pd.DataFrame(
+        {
+            SEMANTIC.NAME: ["Молоко", "Кефир", "Чай", "Сыр"],
+            SEMANTIC.QUERY: ["молоко", "кефир", "чай", "сыр"],
+            SEMANTIC.CLIENT_NAME: [
+                "Молоко Danone 1 л",
+                "Кефир Valio 500 мл",
+                "Чай Lipton зеленый",
+                "Сыр Гауда 200 г",
+            ],
+            SEMANTIC.VC: [None, "kf-12.5", None, None],
+            SEMANTIC.BRAND: ["Danone", "Valio", "Lipton", "Hochland"],
+        }
+    )
+    raw = pd.DataFrame(
+        {
+            RAW.NAME: ["Молоко", "Кефир", "Чай", "Сыр", "Масло"],
+            RAW.LINK: [f"https://a.ru/{number}" for number in range(5)],
+            RAW.ROW: [
+                "молоко danone 1л",
+                "кефир KF12-5",
+                "чай зеленый",
+                "сыр 200г",
+                "масло сливочное",
+            ],
+            RAW.QUERY: ["молоко", "кефир", "чай", "сыр", "молоко"],
+            RAW.MYMARK: [1, 1, 1, 1, 0],
+            RAW.BRAND: ["DANONE", None, "Lipton ", "Hochland", None],
+        }
+    )
+    semantic.to_csv(tmp_path / "semantic.csv", index=False)
+    raw.to_csv(tmp_path / "raw.csv", index=False)
+
+    return DataRepr(DataReprMode.RAW_DECART).proccess_lazy(
+        tmp_path / "semantic.csv",
+        tmp_path / "raw.csv",
+    )
+
+
+def test_decart_labels(tmp_path):
+    decart = make_decart(tmp_path)
+
+    # labeled pairs are the diagonal of 4 semantic rows
+    assert decart.labels.tolist() == [0, 5, 10, 15]
+    # brands are kept for the candidates, but aren't in the pairs rows
+    assert decart.site_brands[0] == "DANONE" and pd.isna(decart.site_brands[1])
+    assert decart.semantic_brands.to_list()[0] == "Danone"
+    assert RAW.BRAND not in decart.materialize(decart.labels).columns
+
+
+def test_candidates_signals(tmp_path):
+    decart = make_decart(tmp_path)
+    generator = make_generator(
+        features=TextFeatureSearch(custom_features_list=[Weight, Volume]),
+    )
+    scores = generator.scores(decart).toarray()
+
+    # every site row gets the best score with its semantic row
+    assert scores[:4].argmax(axis=1).tolist() == [0, 1, 2, 3]
+    # vendor code with the other separators and case
+    assert generator._vc_scores(decart).toarray()[1, 1] == 1
+    # brands are compared stripped and lowercased
+    brands = generator._brand_scores(decart).toarray()
+    assert brands[[0, 2, 3], [0, 2, 3]].tolist() == [1, 1, 1]
+    # nothing in common
+    assert scores[4].sum() == 0
+
+
+def test_top_k_candidates_recall(tmp_path):
+    decart = make_decart(tmp_path)
+
+    candidates = make_generator(top_k=1).generate(decart)
+    assert candidates.tolist() == [0, 5, 10, 15]
+    assert make_generator().recall(candidates, decart.labels) == 1
+
+    candidates = make_generator(top_k=4).generate(decart)
+    assert len(candidates) <= 4 * len(decart.site)
+    assert np.isin(decart.labels, candidates).all()
+
+    pair_ids = list(decart.blocks(3, candidates))
+    assert np.concatenate(pair_ids).tolist() == candidates.tolist()
+
+    with pytest.raises(ValueError):
+        make_generator(top_k=0)
+
+
+def test_candidates_marks_equal_product_marks(tmp_path):
+    sys.path.append(str(Path(__file__).parent.parent.parent))
+    from main import Validator
+
+    decart = make_decart(tmp_path)
+
+    def validate(output: str, candidates: CandidateGenerator = None) -> pd.DataFrame:
+        validator = Validator(
+            data_repr=DataRepr(DataReprMode.RAW_DECART),
+            VC=None,
+            TF=None,
+            jakkar=FuzzyJakkarValidator(
+                tokenizer=RegexTokenizer(
+                    {LanguageType.RUS: 1, LanguageType.ENG: 1},
+                    weights_rules=RegexCustomWeights(1, 1, 1, 1),
+                ),
+                preprocessor=Preprocessor(2),
+                fuzzy=FuzzySearch(75, transformer=TokenTransformer()),
+                # tokens seen 2 times and less get 0 rate
+                rate_counter=VectorRateCounter(0, 1, 2, 0, RateFunction.sqrt2),
+                marks_counter=MarksCounter(MarksMode.MULTIPLE),
+            ),
+        )
+        validator.validate_decart(
+            tmp_path / "semantic.csv",
+            tmp_path / "raw.csv",
+            tmp_path / output,
+            cutoff_column=None,
+            candidates=candidates,
+        )
+        return pd.read_csv(tmp_path / output)
+
+    product = validate("product.csv")
+    candidates = validate("candidates.csv", make_generator(top_k=1))
+
+    # the candidates select the pairs only, the ratio is of the whole product
+    columns = [MarksMode.UNION, JAKKAR.VALIDATED, DATA.VALIDATED]
+    pairs = candidates[[DATA.ROW, DATA.CLIENT_NAME]].merge(product, how="left")
+    assert len(candidates) == len(decart.labels)
+    assert candidates[DATA.VALIDATED].to_list() == [1, 0, 1, 0]
+    pd.testing.assert_frame_equal(candidates[columns], pairs[columns])
@@ -0,0 +1,84 @@
+from pathlib import Path
+import sys
+import pickle
+import regex as re
+from decimal import Decimal
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from features_collection import (
+    FutureList,
+    Weight,
+    Color,
+    Volume,
+    Dimension,
+    Concentration,
+)
+
+
+def test_designations_compiled_once():
+    futures = FutureList([Weight, Color])
+
+    for future in futures:
+        designations = list(future.designations)
+        # designations can be iterated more than once
+        assert designations == list(future.designations)
+
+        for designation in designations:
+            compiled = designation.compiled
+            assert compiled.pattern == designation.regex
+            assert compiled.flags & re.IGNORECASE
+
+    compiled = [measure.compiled for measure in Weight.designations]
+    FutureList([Weight])
+    assert all(
+        measure.compiled is pattern
+        for measure, pattern in zip(Weight.designations, compiled)
+    )
+
+
+def test_compiled_designations_are_picklable():
+    FutureList([Weight])
+    measures = pickle.loads(pickle.dumps(Weight.MEASURES))
+
+    row = "Молоко 500 г 2 кг "
+    for measure, original in zip(measures, Weight.MEASURES):
+        assert measure.compiled.findall(row) == re.findall(
+            original.regex, row, re.IGNORECASE
+        )
+
+
+def test_fixed_point_features_equal_decimal_features():
+    FutureList()
+    values = [
+        (Weight, ["1,5 кг ", "1500 г ", "1500.0г ", "0.0015 г ", "250 мг "]),
+        (Volume, [" 930 мл", " 0,93 л", " 1.5 л"]),
+        (Dimension, ["30x20x10 см", "300х200х100 мм", "0.3x.2x0.1 м", "1,5x2"]),
+        (Concentration, ["5 мг/мл", "5мг/1мл", "10мг/3мл", "1 г/л", "2%", "2,0 %"]),
+    ]
+
+    for feature, rows in values:
+        found = [
+            (feature(value, designation), feature(value, designation, True))
+            for row in rows
+            for designation in feature.designations
+            for value in designation.compiled.findall(row)
+        ]
+        assert len(found) >= len(rows)
+
+        for decimal, fixed in found:
+            if isinstance(decimal.standard_value, Decimal):
+                assert fixed.standard_value == decimal.standard_value.scaleb(
+                    feature.FIXED_POINT_SCALE
+                )
+
+        for decimal1, fixed1 in found:
+            for decimal2, fixed2 in found:
+                assert (decimal1 == decimal2) == (fixed1 == fixed2)
+                if fixed1 == fixed2:
+                    assert hash(fixed1) == hash(fixed2)
+
+    assert Weight("1,5 кг ", Weight.MEASURES.measures[3], True).standard_value == (
+        1500 * 10**Weight.FIXED_POINT_SCALE
+    )
+    assert str(Weight("1,5 кг ", Weight.MEASURES.measures[3], True)) == "Weight = 1500"
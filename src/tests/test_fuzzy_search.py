@@ -0,0 +1,201 @@
+from pathlib import Path
+import sys
+import random
+import multiprocessing
+import pandas as pd
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from jakkar.jakkar import (
+    FuzzySearch,
+    FuzzyBlockingIndex,
+    FuzzyScorer,
+    TokenTransformer,
+)
+from tokenization import Token
+from cache import BoundedCache
+import fuzzy_search
+
+
+WORDS = [
+    "молоко",
+    "молок",
+    "кефир",
+    "danone",
+    "danon",
+    "valio",
+    "500мл",
+    "500",
+    "ultra",
+    "ультра",
+    "пастеризованное",
+    "простоквашино",
+    "x2",
+    "gold",
+    "goldd",
+]
+
+
+def make_data(rows: int = 200, seed: int = 0) -> pd.DataFrame:
+    rng = random.Random(seed)
+    data = [
+        [
+            [Token(word, rng.randint(1, 3)) for word in rng.sample(WORDS, 4)],
+            [Token(word, rng.randint(1, 3)) for word in rng.sample(WORDS, 5)],
+        ]
+        for _ in range(rows)
+    ]
+    return pd.DataFrame(data=data, columns=["left", "right"])
+
+
+def tokens_state(data: pd.DataFrame) -> list:
+    return [
+        [(token.value, token.custom_weight) for token in tokens]
+        for column in ["left", "right"]
+        for tokens in data[column]
+    ]
+
+
+def test_blocking_index_keeps_passing_candidates():
+    index = FuzzyBlockingIndex()
+    choices = ["danone", "молоко", "valio", "gold"]
+
+    candidates = index.candidates("danon", choices, 75)
+    assert candidates == ["danone"]
+
+    candidates = index.candidates("danon", choices, 0)
+    assert candidates == choices
+
+
+def test_blocking_search_equals_default_search():
+    for threshold in [50, 75, 90]:
+        default = FuzzySearch(threshold, TokenTransformer())
+        blocked = FuzzySearch(
+            threshold,
+            TokenTransformer(),
+            blocking_index=FuzzyBlockingIndex(),
+        )
+
+        data1 = default.search(make_data(), "left", "right", None)
+        data2 = blocked.search(make_data(), "left", "right", None)
+
+        assert tokens_state(data1) == tokens_state(data2)
+
+
+def test_cached_search_equals_default_search(tmp_path):
+    default = FuzzySearch(75, TokenTransformer())
+    cached = FuzzySearch(
+        75,
+        TokenTransformer(),
+        cache=BoundedCache(path=tmp_path / "fuzzy.pkl"),
+    )
+
+    data1 = default.search(make_data(), "left", "right", None)
+    data2 = cached.search(make_data(), "left", "right", None)
+
+    assert tokens_state(data1) == tokens_state(data2)
+    assert cached.cache_hits > 0
+    assert cached.cache_misses == len(cached.cache)
+
+    # cache is saved after search and reused by the next run
+    reloaded = FuzzySearch(
+        75,
+        TokenTransformer(),
+        cache=BoundedCache(path=tmp_path / "fuzzy.pkl"),
+    )
+    data3 = reloaded.search(make_data(), "left", "right", None)
+
+    assert tokens_state(data1) == tokens_state(data3)
+    assert reloaded.cache_misses == 0
+
+
+def test_parallel_search_equals_serial_search():
+    serial = FuzzySearch(75, TokenTransformer())
+    parallel = FuzzySearch(
+        75,
+        TokenTransformer(),
+        blocking_index=FuzzyBlockingIndex(),
+        cache=BoundedCache(),
+        chunk_size=7,
+    )
+
+    data1 = serial.search(make_data(), "left", "right", None)
+
+    data2 = make_data()
+    tokens = data2["left"].to_list()
+    with multiprocessing.Pool(2) as pool:
+        data2 = parallel.search(data2, "left", "right", pool)
+
+    assert tokens_state(data1) == tokens_state(data2)
+    # results are written back into the same token objects
+    assert all(a is b for a, b in zip(tokens, data2["left"]))
+    assert parallel.cache_hits + parallel.cache_misses > 0
+
+
+def test_parallel_search_uses_parent_cache(tmp_path):
+    serial = FuzzySearch(
+        75,
+        TokenTransformer(),
+        cache=BoundedCache(path=tmp_path / "fuzzy.pkl"),
+    )
+    serial.search(make_data(rows=10), "left", "right", None)
+    size = len(serial.cache)
+
+    # the pool copies get the persisted scores and send the new ones back
+    parallel = FuzzySearch(
+        75,
+        TokenTransformer(),
+        cache=BoundedCache(path=tmp_path / "fuzzy.pkl"),
+        chunk_size=7,
+    )
+    empty = FuzzySearch(75, TokenTransformer(), cache=BoundedCache(), chunk_size=7)
+    with multiprocessing.Pool(2) as pool:
+        data1 = parallel.search(make_data(), "left", "right", pool)
+        empty.search(make_data(), "left", "right", pool)
+
+    # the persisted scores aren't scored again
+    assert parallel.cache_misses < empty.cache_misses
+    assert len(parallel.cache) == len(empty.cache) > size
+
+    # the next run reads all the scores from the saved cache
+    reloaded = FuzzySearch(
+        75,
+        TokenTransformer(),
+        cache=BoundedCache(path=tmp_path / "fuzzy.pkl"),
+    )
+    data2 = reloaded.search(make_data(), "left", "right", None)
+
+    assert tokens_state(data1) == tokens_state(data2)
+    assert reloaded.cache_misses == 0
+
+
+def test_worker_keeps_only_current_search():
+    fuzzy = FuzzySearch(75, TokenTransformer(), cache=BoundedCache())
+    row = ((("danon", 1),), (("danone", 1), ("valio", 1)))
+
+    for search_id in [-1, -2]:
+        output, _, misses, scores = fuzzy_search.search_chunk(
+            search_id,
+            fuzzy._worker_copy(),
+            ([row], {("danon", "valio"): 0}),
+        )
+        assert misses == 1
+        assert list(scores) == [("danon", "danone")]
+        assert list(fuzzy_search._worker_searches) == [search_id]
+
+    fuzzy_search._worker_searches.clear()
+
+
+def test_cdist_scorer_parity():
+    for threshold in [50, 75, 90]:
+        default = FuzzySearch(threshold, TokenTransformer())
+        batch = FuzzySearch(threshold, TokenTransformer(), scorer=FuzzyScorer.CDIST)
+
+        data1 = default.search(make_data(), "left", "right", None)
+        data2 = batch.search(make_data(), "left", "right", None)
+
+        assert tokens_state(data1) == tokens_state(data2)
+
+
+if __name__ == "__main__":
+    test_blocking_search_equals_default_search()
@@ -0,0 +1,77 @@
+from pathlib import Path
+import sys
+import pandas as pd
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from jakkar.jakkar import (
+    FuzzyJakkarValidator,
+    RegexTokenizer,
+    RegexCustomWeights,
+    LanguageType,
+    Preprocessor,
+    FuzzySearch,
+    TokenTransformer,
+    RateCounter,
+    RateFunction,
+    MarksCounter,
+    MarksMode,
+)
+from notation import DATA, JAKKAR
+
+
+def make_validator(deduplicate: bool) -> FuzzyJakkarValidator:
+    return FuzzyJakkarValidator(
+        tokenizer=RegexTokenizer(
+            {LanguageType.RUS: 1, LanguageType.ENG: 2},
+            weights_rules=RegexCustomWeights(3, 2, 1, 1),
+        ),
+        preprocessor=Preprocessor(2),
+        fuzzy=FuzzySearch(75, transformer=TokenTransformer()),
+        rate_counter=RateCounter(0, 1, 2, 0.5, RateFunction.sqrt2),
+        marks_counter=MarksCounter(MarksMode.MULTIPLE),
+        deduplicate=deduplicate,
+    )
+
+
+def make_data() -> pd.DataFrame:
+    pairs = [
+        ["Молоко Danone 500 мл", "молоко danon 500мл ультра"],
+        ["Кефир Valio 1 л", "кефир valio 1л"],
+        ["Молоко Danone 500 мл", "молоко danon 500мл ультра"],
+        ["Сыр Gold 200 г", "сыр голд 200г"],
+        ["Молоко Danone 500 мл", "кефир valio 1л"],
+        ["Кефир Valio 1 л", "кефир valio 1л"],
+    ]
+    data = pd.DataFrame(data=pairs, columns=[DATA.CLIENT_NAME, DATA.ROW])
+    data[DATA.VALIDATED] = 1
+    data[JAKKAR.VALIDATED] = [1, 1, 0, 1, 1, 1]
+    return data
+
+
+def test_deduplicated_validation_equals_default():
+    data1, columns1 = make_validator(False).validate(make_data(), None)
+    data2, columns2 = make_validator(True).validate(make_data(), None)
+
+    assert columns1 == columns2
+    pd.testing.assert_frame_equal(data1[columns1], data2[columns2])
+    # rows of the same pair get the same marks
+    assert data2.loc[0, columns2[-1]] == data2.loc[2, columns2[-1]]
+
+
+def test_two_pass_chunks_validation_equals_default():
+    for deduplicate in [False, True]:
+        data1, columns = make_validator(deduplicate).validate(make_data(), None)
+
+        validator = make_validator(deduplicate)
+        data = make_data()
+        chunks = [data.iloc[:2].copy(), data.iloc[2:].copy()]
+        for chunk in chunks:
+            validator.accumulate(chunk, None)
+        validator.fix_ratio()
+
+        data2 = pd.concat([validator.validate(chunk, None)[0] for chunk in chunks])
+        validator.free_ratio()
+
+        assert validator.returning_columns == columns
+        pd.testing.assert_frame_equal(data1[columns], data2[columns])
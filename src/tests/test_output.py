@@ -0,0 +1,126 @@
+from pathlib import Path
+import sys
+import pytest
+import pandas as pd
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from output import OutputWriter, ListMode, serialize_lists, write_data
+from tokenization import Token
+from features_collection import Weight
+
+
+def make_output() -> pd.DataFrame:
+    weight = Weight("0,5 кг ", Weight.MEASURES.measures[3], True)
+    return pd.DataFrame(
+        {
+            "row": ["Молоко 1 л", "Кефир 1%", "Молоко 1л"],
+            "tokens": [{Token("молоко", 1), Token("1л", 2)}, set(), None],
+            "features": [[weight], [], [weight, weight]],
+            "vc": ["0123", 123, None],
+            "validated": [1, 0, 1],
+        }
+    )
+
+
+def test_serialize_lists():
+    data = serialize_lists(make_output())
+
+    assert data["tokens"].to_list() == ["1л; молоко", "", None]
+    assert data["features"].to_list() == [
+        "Weight = 500",
+        "",
+        "Weight = 500; Weight = 500",
+    ]
+    assert data["vc"].to_list() == ["0123", "123", None]
+    assert data["validated"].to_list() == [1, 0, 1]
+
+    data = serialize_lists(make_output(), ListMode.ARROW)
+    assert data["tokens"].to_list() == [["1л", "молоко"], [], None]
+
+
+def test_csv_writer(tmp_path):
+    data = make_output()
+
+    writer = OutputWriter(tmp_path / "output.csv")
+    writer.write(data.iloc[:2])
+    writer.write(data.iloc[2:])
+    writer.close()
+
+    output = pd.read_csv(tmp_path / "output.csv", keep_default_na=False)
+    assert writer.rows == len(output) == 3
+    assert output["tokens"].to_list() == ["1л; молоко", "", ""]
+    assert set(writer.timings) == {"serialize", "write", "close"}
+
+    with pytest.raises(NotImplementedError):
+        OutputWriter(tmp_path / "output.txt")
+
+
+def test_excel_writer_equals_csv_writer(tmp_path, monkeypatch):
+    import output
+
+    # rows over the sheet limit go to the next sheet
+    monkeypatch.setattr(output, "EXCEL_MAX_ROWS", 3)
+    data = make_output()
+
+    write_data(data, tmp_path / "output.csv", chunk_size=2)
+    writer = write_data(data, tmp_path / "output.xlsx", chunk_size=2)
+
+    csv = pd.read_csv(tmp_path / "output.csv", dtype=str)
+    sheets = pd.read_excel(tmp_path / "output.xlsx", sheet_name=None, dtype=str)
+    excel = pd.concat(sheets.values(), ignore_index=True)
+
+    assert writer.rows == 3
+    assert len(sheets) == 2
+    pd.testing.assert_frame_equal(csv, excel)
+
+
+def test_arrow_writer(tmp_path):
+    pytest.importorskip("pyarrow")
+    data = make_output()
+
+    for list_mode in [ListMode.JOINED, ListMode.ARROW]:
+        for name in ["output.parquet", "output.feather"]:
+            write_data(data, tmp_path / name, list_mode, chunk_size=2)
+
+    output = pd.read_feather(tmp_path / "output.feather")
+    assert list(output["tokens"][0]) == ["1л", "молоко"]
+    assert output["vc"].to_list() == ["0123", "123", None]
+
+
+def test_arrow_writer_null_first_chunks(tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    import output
+
+    data = make_output()
+    data["mark"] = [0.5, 1.0, None]
+    # stage columns of the rows skipped by the stage are NaN
+    nulls = data.iloc[:2].copy()
+    nulls[["tokens", "features", "mark"]] = float("nan")
+    nulls["vc"] = None
+
+    def write(path, list_mode) -> pd.DataFrame:
+        writer = OutputWriter(path, list_mode)
+        writer.write(data.iloc[:0])  # block emptied by the cutoff
+        writer.write(nulls)
+        writer.write(data)
+        writer.close()
+        if path.suffix == ".feather":
+            return pd.read_feather(path)
+        return pd.read_parquet(path)
+
+    for name in ["output.parquet", "output.feather"]:
+        output_data = write(tmp_path / name, ListMode.JOINED)
+        assert output_data["vc"].to_list() == [None, None, "0123", "123", None]
+        assert output_data["tokens"].to_list()[2:] == ["1л; молоко", "", None]
+        assert output_data["mark"].to_list()[3] == 1.0
+        assert output_data["validated"].to_list() == [1, 0, 1, 0, 1]
+
+        output_data = write(tmp_path / name, ListMode.ARROW)
+        assert list(output_data["tokens"][2]) == ["1л", "молоко"]
+        assert output_data["tokens"][:2].isna().all()
+
+    # the types aren't known in the kept rows: lists are joined strings
+    monkeypatch.setattr(output, "ARROW_PENDING_ROWS", 2)
+    output_data = write(tmp_path / "output.parquet", ListMode.ARROW)
+    assert output_data["tokens"].to_list() == [None, None, "1л; молоко", "", None]
@@ -0,0 +1,102 @@
+from pathlib import Path
+import sys
+import random
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from jakkar.jakkar import (
+    MarksCounter,
+    SparseMarksCounter,
+    MarksMode,
+    RateCounter,
+    VectorRateCounter,
+    RateFunction,
+)
+from tokenization import Token
+
+
+WORDS = ["молоко", "кефир", "danone", "valio", "500мл", "ультра", "gold", "x2"]
+
+
+def make_data(rows: int = 300, seed: int = 0) -> tuple[pd.DataFrame, dict]:
+    rng = random.Random(seed)
+    ratio = {word: rng.choice([0, 0.25, 0.5, 1]) for word in WORDS}
+
+    def tokens_set():
+        words = rng.sample(WORDS, rng.randint(0, 5))
+        return {Token(word, rng.randint(1, 3)) for word in words}
+
+    data = pd.DataFrame({"left": [tokens_set() for _ in range(rows)]})
+    data["right"] = [tokens_set() for _ in range(rows)]
+    return data, ratio
+
+
+def test_sparse_marks_equal_marks():
+    data, ratio = make_data()
+
+    for mode in [
+        MarksMode.MULTIPLE,
+        MarksMode.UNION,
+        MarksMode.CLIENT,
+        MarksMode.SOURCE,
+    ]:
+        columns1, columns2 = [], []
+        data1 = MarksCounter(mode).count_marks(
+            ratio, data.copy(), "left", "right", columns1
+        )
+        data2 = SparseMarksCounter(mode).count_marks(
+            ratio, data.copy(), "left", "right", columns2
+        )
+
+        assert columns1 == columns2
+        for column in columns1:
+            assert np.allclose(data1[column], data2[column], rtol=1e-12, atol=0)
+
+
+def test_vector_rate_counter_equals_rate_counter():
+    data, _ = make_data(rows=500, seed=1)
+    data["left"] = data["left"].apply(list)
+    data["right"] = data["right"].apply(list)
+    data["count"] = np.arange(len(data)) % 3 + 1
+
+    for rate_function in [
+        RateFunction.default,
+        RateFunction.sqrt2,
+        RateFunction.log,
+        RateFunction.parabaloid,
+        lambda value, max_value: value + 1,
+    ]:
+        for counts_column in [None, "count"]:
+            args = (0, 0.5, 2, 0.5, rate_function)
+            ratio1 = RateCounter(*args).count_ratio(data, "left", "right", counts_column)
+            ratio2 = VectorRateCounter(*args).count_ratio(
+                data, "left", "right", counts_column
+            )
+
+            assert list(ratio1) == list(ratio2)
+            assert np.allclose(
+                list(ratio1.values()), list(ratio2.values()), rtol=1e-12, atol=0
+            )
+
+
+def test_accumulated_ratio_equals_ratio():
+    data, _ = make_data(rows=500, seed=2)
+    data["left"] = data["left"].apply(list)
+    data["right"] = data["right"].apply(list)
+    data["count"] = np.arange(len(data)) % 3 + 1
+
+    for rate_counter_class in [RateCounter, VectorRateCounter]:
+        for counts_column in [None, "count"]:
+            rate_counter = rate_counter_class(0, 0.5, 2, 0.5, RateFunction.sqrt2)
+            ratio = rate_counter.count_ratio(data, "left", "right", counts_column)
+
+            for start in range(0, len(data), 120):
+                chunk = data.iloc[start : start + 120]
+                rate_counter.accumulate(chunk, "left", "right", counts_column)
+
+            assert rate_counter.accumulated_ratio() == ratio
+
+            rate_counter.reset_counts()
+            assert rate_counter.accumulated_ratio() == {}
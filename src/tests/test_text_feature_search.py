@@ -0,0 +1,266 @@
+from pathlib import Path
+import sys
+import random
+import pandas as pd
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from text_feature import (
+    TextFeatureSearch,
+    FeatureSearchMode,
+    FusedScanner,
+    FeatureSide,
+    CascadeScheduler,
+)
+from features_collection import (
+    FutureList,
+    Weight,
+    Measure,
+    FeatureValidationMode,
+    FeatureNotFoundMode,
+    NotFoundStatus,
+)
+from notation import DATA, FEATURES
+from cache import BoundedCache
+
+
+ROWS = [
+    ["Молоко 1,5 л 930 мл", "молоко 930мл 1.5л"],
+    ["Сахар 1 кг 1000 г", "сахар 1000г"],
+    ["Ибупрофен таб. 200 мг 20 шт", "ибупрофен 200мг таблетки 20шт"],
+    ["Коробка 30x20x10 см черная", "коробка 300х200х100 мм белая"],
+    ["Раствор 5 мг/мл 2%", "раствор 5мг/мл"],
+    ["Флешка 32 ГБ", "флешка 64gb"],
+    ["", "nan"],
+]
+
+
+def make_data() -> pd.DataFrame:
+    data = pd.DataFrame(data=ROWS, columns=[DATA.CLIENT_NAME, DATA.ROW])
+    data[DATA.VALIDATION_STATUS] = 0
+    data[DATA.VALIDATED] = 1
+    data[FEATURES.VALIDATED] = 1
+    data[FEATURES.NOT_FOUND] = ""
+    return data
+
+
+def features_state(data: pd.DataFrame) -> list:
+    return [
+        [(type(feature).__name__, str(feature)) for feature in features]
+        for column in [FEATURES.CLIENT, FEATURES.SOURCE]
+        for features in data[column]
+    ]
+
+
+def test_fused_scanner_equals_findall():
+    FutureList([Weight])
+    designations = list(Weight.designations) + [
+        Measure("Грамм без числа", 1, "", regex=r"г|кг")
+    ]
+    scanner = FusedScanner(designations)
+
+    for row in ["1 кг 1000 г 5мг", "кг 1кг 2 г.", "", "мг/мл 3 mg"]:
+        assert scanner.findall(row) == [
+            designation.compiled.findall(row) for designation in designations
+        ]
+
+
+def test_fused_search_equals_separate_search():
+    for skip_intermediate_validated in [False, True]:
+        data1, columns = TextFeatureSearch(
+            skip_validated=False,
+            skip_intermediate_validated=skip_intermediate_validated,
+        ).validate(make_data(), None)
+
+        data2, _ = TextFeatureSearch(
+            skip_validated=False,
+            skip_intermediate_validated=skip_intermediate_validated,
+            search_mode=FeatureSearchMode.FUSED,
+        ).validate(make_data(), None)
+
+        assert features_state(data1) == features_state(data2)
+        assert data1[[DATA.VALIDATED, FEATURES.STATUS]].equals(
+            data2[[DATA.VALIDATED, FEATURES.STATUS]]
+        )
+
+
+def test_cached_search_equals_default_search(tmp_path):
+    data1, _ = TextFeatureSearch(skip_validated=False).validate(make_data(), None)
+
+    for search_mode in [FeatureSearchMode.SEPARATE, FeatureSearchMode.FUSED]:
+        cache = BoundedCache(path=tmp_path / f"{search_mode}.pkl")
+        search = TextFeatureSearch(
+            skip_validated=False,
+            search_mode=search_mode,
+            cache=cache,
+        )
+        data2, _ = search.validate(make_data(), None)
+
+        assert features_state(data1) == features_state(data2)
+        assert cache.misses == len(cache)
+        assert data2.attrs[FEATURES.CACHE_STATS] == search.cache_stats
+
+        # cache is saved after validation and reused by the next run
+        reloaded = BoundedCache(path=tmp_path / f"{search_mode}.pkl")
+        search = TextFeatureSearch(
+            skip_validated=False,
+            search_mode=search_mode,
+            cache=reloaded,
+        )
+        data3, _ = search.validate(make_data(), None)
+
+        for column in [FEATURES.CLIENT, FEATURES.SOURCE, FEATURES.STATUS]:
+            assert data1[column].to_list() == data3[column].to_list()
+        assert reloaded.misses == 0
+
+    # stored results of another features set aren't used
+    search = TextFeatureSearch(
+        skip_validated=False,
+        custom_features_list=[Weight],
+        cache=BoundedCache(path=tmp_path / f"{FeatureSearchMode.SEPARATE}.pkl"),
+    )
+    search.validate(make_data(), None)
+    assert search.cache.hits == 0
+
+
+def test_cache_stats_reach_validator_result():
+    sys.path.append(str(Path(__file__).parent.parent.parent))
+    from main import Validator
+
+    # skip_validated: the stage validates a filtered copy of the data
+    search = TextFeatureSearch(skip_validated=True, cache=BoundedCache())
+    validator = Validator(None, None, search, None)
+    data = validator._process_validation(search.validate, make_data())
+
+    assert data.attrs[FEATURES.CACHE_STATS] == search.cache_stats
+    assert data.attrs[FEATURES.CACHE_STATS]["misses"] > 0
+
+
+def test_features_table():
+    search = TextFeatureSearch(skip_validated=False)
+    data1, columns = search.validate(make_data(), None)
+    table = search.features_table
+
+    assert list(table.columns) == [
+        FEATURES.ROW_ID,
+        FEATURES.SIDE,
+        FEATURES.FEATURE_ID,
+        FEATURES.VALUE,
+        FEATURES.FEATURE,
+    ]
+    assert all(
+        feature.standard_value == value
+        for feature, value in zip(table[FEATURES.FEATURE], table[FEATURES.VALUE])
+    )
+
+    client = table[table[FEATURES.SIDE] == FeatureSide.CLIENT]
+    assert sum(map(len, data1[FEATURES.CLIENT])) == len(client)
+    assert data1.loc[1, FEATURES.CLIENT] == client.loc[
+        client[FEATURES.ROW_ID] == 1, FEATURES.FEATURE
+    ].to_list()
+
+    # feature lists are made for the output only
+    search = TextFeatureSearch(skip_validated=False, output_features=False)
+    data2, columns = search.validate(make_data(), None)
+
+    assert FEATURES.CLIENT not in columns and FEATURES.CLIENT not in data2
+    assert data1[FEATURES.STATUS].equals(data2[FEATURES.STATUS])
+
+
+def test_vectorized_intermediate_validation():
+    rng = random.Random(0)
+    search = TextFeatureSearch()
+    FutureList([Weight])
+    measure = Weight.MEASURES.measures[2]
+
+    rows = []
+    for row_id in range(300):
+        for side in [FeatureSide.CLIENT, FeatureSide.SOURCE]:
+            for _ in range(rng.choice([0, 0, 1, 2, 3])):
+                feature = Weight(f"{rng.choice(['1', '1.0', '2', '3'])} г ", measure)
+                rows.append([row_id, side, 0, feature.standard_value, feature])
+    table = pd.DataFrame(
+        rows,
+        columns=[
+            FEATURES.ROW_ID,
+            FEATURES.SIDE,
+            FEATURES.FEATURE_ID,
+            FEATURES.VALUE,
+            FEATURES.FEATURE,
+        ],
+    )
+
+    for val_mode in [
+        FeatureValidationMode.STRICT,
+        FeatureValidationMode.MODEST,
+        FeatureValidationMode.CLIENT,
+        FeatureValidationMode.SOURCE,
+    ]:
+        for not_found_mode in [
+            FeatureNotFoundMode.STRICT,
+            FeatureNotFoundMode.MODEST,
+            NotFoundStatus.ACCEPT,
+        ]:
+
+            class Feature(Weight):
+                VALIDATION_MODE = val_mode
+                NOT_FOUND_MODE = not_found_mode
+
+            data = pd.DataFrame(
+                {FEATURES.INTERMEDIATE_VALIDATION: [1, 0] * 150},
+                index=range(300),
+            )
+            data = search._intermediate_validation(data, table, Feature)
+
+            for row_id, desicion in enumerate(data[FEATURES.INTERMEDIATE_VALIDATION]):
+                features = table[table[FEATURES.ROW_ID] == row_id]
+                cif = set(features[features[FEATURES.SIDE] == 0][FEATURES.FEATURE])
+                sif = set(features[features[FEATURES.SIDE] == 1][FEATURES.FEATURE])
+
+                expected = row_id % 2 == 0
+                not_found = NotFoundStatus(cif, sif, not_found_mode, "Weight")
+                if expected and not_found:
+                    expected = not_found.desicion
+                elif expected:
+                    based = search._determine_based_intersection(cif, sif, val_mode)
+                    expected = len(cif & sif) == based
+
+                assert desicion == int(expected)
+
+
+def test_cascade_rejects_rows_as_full_validation(tmp_path):
+    data1, _ = TextFeatureSearch(
+        skip_validated=False,
+        skip_intermediate_validated=False,
+    ).validate(make_data(), None)
+
+    scheduler = CascadeScheduler(tmp_path / "stats.json")
+    for _ in range(2):
+        data2, _ = TextFeatureSearch(
+            skip_validated=False,
+            scheduler=scheduler,
+        ).validate(make_data(), None)
+
+        assert data1[DATA.VALIDATED].equals(data2[DATA.VALIDATED])
+        assert data1[FEATURES.VALIDATED].equals(data2[FEATURES.VALIDATED])
+        rejected = data2[DATA.VALIDATED] == 0
+        assert data2.loc[rejected, FEATURES.STATUS].str.startswith("Not validated").all()
+
+    stats = CascadeScheduler(tmp_path / "stats.json").stats
+    assert stats == scheduler.stats
+    # every rejected row is counted once per run
+    assert sum(feature["rejected"] for feature in stats.values()) == 2 * rejected.sum()
+
+
+def test_cascade_scheduler_order():
+    scheduler = CascadeScheduler()
+    futures = list(FutureList())
+
+    for feature, rejected in zip(futures, range(len(futures))):
+        scheduler.update(feature, 100, rejected, 1.0)
+    assert scheduler.order(futures) == futures[::-1]
+
+    # features without stats go first in their order
+    del scheduler.stats[futures[3].NAME]
+    del scheduler.stats[futures[5].NAME]
+    assert scheduler.order(futures)[:2] == [futures[3], futures[5]]
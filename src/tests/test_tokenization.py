@@ -0,0 +1,90 @@
+from pathlib import Path
+import sys
+import pytest
+import pandas as pd
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from jakkar.jakkar import (
+    RegexTokenizer,
+    SinglePassRegexTokenizer,
+    RegexCustomWeights,
+    LanguageType,
+)
+from tokenization import Token
+from cache import BoundedCache
+
+
+ROWS = [
+    "Молоко DANONE Ультра 500мл",
+    "кефир Valio 1 л",
+    "Молоко DANONE Ультра 500мл",
+    "Сыр GOLD x2 Россия",
+    "кефир Valio 1 л",
+]
+
+
+def make_tokenizer(cache: BoundedCache = None) -> RegexTokenizer:
+    return RegexTokenizer(
+        {LanguageType.RUS: 1, LanguageType.ENG: 2},
+        weights_rules=RegexCustomWeights(3, 2, 1, 1),
+        cache=cache,
+    )
+
+
+def tokens_state(tokens: pd.Series) -> list:
+    return [
+        [(token.original_value, token.custom_weight) for token in row]
+        for row in tokens
+    ]
+
+
+def test_cached_tokenization_equals_extraction(tmp_path):
+    data = pd.DataFrame({"row": ROWS})
+    expected = make_tokenizer()._extract_tokens(data.copy(), "row", "tokens")
+
+    cache = BoundedCache(path=tmp_path / "tokens.pkl")
+    tokenizer = make_tokenizer(cache)
+    data = tokenizer.tokenize(data, "row", "tokens")
+
+    assert tokens_state(data["tokens"]) == tokens_state(expected["tokens"])
+    assert cache.misses == 3
+    # every row gets its own token objects
+    assert data["tokens"][0][0] is not data["tokens"][2][0]
+
+    # the second column (and the next run) reuses the cache
+    reloaded = BoundedCache(path=tmp_path / "tokens.pkl")
+    data = make_tokenizer(reloaded).tokenize(data, "row", "tokens2")
+
+    assert tokens_state(data["tokens2"]) == tokens_state(expected["tokens"])
+    assert reloaded.misses == 0
+
+
+def test_single_pass_tokenizer_equals_regex_tokenizer():
+    values = ROWS + ["", "500", "ЖОПА1234-1234 Ваня228 Ajax Ajax17", "abc_def"]
+    weights = RegexCustomWeights(3, 2, 1, 1)
+
+    for languages in [
+        {LanguageType.RUS: 1, LanguageType.ENG: 2},
+        {LanguageType.ENG: 3, LanguageType.RUS: 1},
+    ]:
+        expected = RegexTokenizer(languages, weights)._tokenize_values(values)
+        tokens = SinglePassRegexTokenizer(languages, weights)._tokenize_values(values)
+        assert tokens == expected
+
+    with pytest.raises(NotImplementedError):
+        SinglePassRegexTokenizer(
+            {LanguageType.RUS: 1},
+            RegexCustomWeights(1, 1, 1, 1, symbols="-"),
+        )
+
+
+def test_token_is_compact():
+    token1 = Token("Молоко", 2)
+    token2 = Token("".join(["моло", "ко"]), 1)
+
+    assert not hasattr(token1, "__dict__")
+    assert token1 == token2 and token1 == "молоко"
+    assert hash(token1) == hash("молоко")
+    # equal values share one string object
+    assert token1.value is token2.value
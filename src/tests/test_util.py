@@ -0,0 +1,162 @@
+from pathlib import Path
+import sys
+import pytest
+import pandas as pd
+
+sys.path.append(str(Path(__file__).parent.parent))
+
+from util import (
+    DataRepr,
+    DataReprMode,
+    DataFormat,
+    read_data,
+    iter_data,
+    convert_data,
+)
+from groupby_validator import GroupByValidator
+from notation import DATA, RAW, SEMANTIC
+
+
+def make_validation() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            DATA.NAME: ["Молоко", "Кефир", "Молоко"],
+            DATA.QUERY: ["молоко", "кефир", "молоко"],
+            DATA.LINK: ["https://a.ru/1", "https://b.ru/2", "https://b.ru/3"],
+            DATA.ROW: ["Молоко 1 л", "Кефир 1%", "Молоко 1л"],
+            DATA.CLIENT_NAME: ["Молоко 1 л", "Кефир 1 %", "Молоко 1 л"],
+            DATA.SOURCE_NAME: ["Молоко 1 л", "Кефир 1%", "Молоко 1л"],
+            DATA.VC: ["0123", None, "ax-1"],
+            DATA.SOURCE: ["a.ru", "b.ru", "b.ru"],
+            DATA.REGION: ["Москва", None, "Москва"],
+            DATA.CLIENT_PRICE: [100, 50, 100],
+            DATA.SOURCE_PRICE: [110, 50, 90],
+            "Unused column": [1, 2, 3],
+        }
+    )
+
+
+def test_data_format_from_path():
+    assert DataFormat.from_path("data/validation.XLSX") == DataFormat.EXCEL
+    assert DataFormat.from_path("validation.parquet") == DataFormat.PARQUET
+    assert DataFormat.from_path("validation.arrow") == DataFormat.FEATHER
+
+    with pytest.raises(NotImplementedError):
+        DataFormat.from_path("validation.json")
+
+
+def test_csv_validation_equals_excel(tmp_path):
+    data = make_validation()
+    data.to_excel(tmp_path / "validation.xlsx", index=False)
+
+    path = convert_data(tmp_path / "validation.xlsx", DataFormat.CSV)
+    assert path == tmp_path / "validation.csv"
+
+    data_repr = DataRepr(DataReprMode.VALIDATION)
+    excel = data_repr.proccess(None, None, tmp_path / "validation.xlsx")
+    csv = data_repr.proccess(None, None, path)
+
+    assert list(csv.columns) == DATA.validation_cols[:-1]
+    assert csv[DATA.VC].to_list()[0] == "0123"
+    for column in [DATA.QUERY, DATA.SOURCE, DATA.REGION]:
+        assert isinstance(csv[column].dtype, pd.CategoricalDtype)
+
+    # leading zero of the vendor code is lost by excel
+    columns = [column for column in csv.columns if column != DATA.VC]
+    pd.testing.assert_frame_equal(excel[columns], csv[columns])
+
+    data = DataRepr(DataReprMode.VALIDATION, project_columns=False).proccess(
+        None, None, path
+    )
+    assert "Unused column" in data.columns
+
+
+def test_columnar_formats_equal_csv(tmp_path):
+    pytest.importorskip("pyarrow")
+
+    make_validation().to_csv(tmp_path / "validation.csv", index=False)
+    csv = read_data(tmp_path / "validation.csv", DATA.validation_cols)
+
+    for data_format in [DataFormat.PARQUET, DataFormat.FEATHER]:
+        path = convert_data(tmp_path / "validation.csv", data_format)
+        data = read_data(path, DATA.validation_cols)
+        pd.testing.assert_frame_equal(csv, data)
+
+
+def test_chunks_equal_data(tmp_path):
+    make_validation().to_excel(tmp_path / "validation.xlsx", index=False)
+    csv_path = convert_data(tmp_path / "validation.xlsx", DataFormat.CSV)
+
+    for path in [tmp_path / "validation.xlsx", csv_path]:
+        data = read_data(path, DATA.validation_cols)
+        chunks = list(iter_data(path, DATA.validation_cols, chunk_size=2))
+
+        assert [len(chunk) for chunk in chunks] == [2, 1]
+        chunks = pd.concat(chunks)
+        for column in DATA.category_cols:
+            if column in data.columns:
+                chunks[column] = chunks[column].astype(data[column].dtype)
+        pd.testing.assert_frame_equal(data, chunks)
+
+    with pytest.raises(NotImplementedError):
+        list(DataRepr(DataReprMode.RAW).proccess_chunks(csv_path))
+
+
+def test_lazy_decart_equals_decart(tmp_path):
+    semantic = pd.DataFrame(
+        {
+            SEMANTIC.NAME: ["Молоко", "Кефир", "Молоко"],
+            SEMANTIC.QUERY: ["молоко", "кефир", "молоко"],
+            SEMANTIC.CLIENT_NAME: ["Молоко 1 л", "Кефир 1 %", "Молоко 1 л"],
+            SEMANTIC.VC: ["0123", None, "0123"],
+            SEMANTIC.BRAND: ["Danone", None, "Danone"],
+        }
+    )
+    raw = pd.DataFrame(
+        {
+            RAW.NAME: ["Молоко", "Кефир", "Молоко", "Молоко"],
+            RAW.LINK: [
+                "https://a.ru/1",
+                "https://b.ru/2",
+                "https://b.ru/3",
+                "https://a.ru/1",
+            ],
+            RAW.ROW: ["Молоко 1 л", "Кефир 1%", "Молоко 1л", "Молоко 1 л"],
+            RAW.QUERY: ["молоко", "кефир", "молоко", "молоко"],
+            RAW.BRAND: ["Danone", None, None, "Danone"],
+            RAW.MYMARK: [1, 1, 0, 1],
+        }
+    )
+    semantic.to_csv(tmp_path / "semantic.csv", index=False)
+    raw.to_csv(tmp_path / "raw.csv", index=False)
+
+    data_repr = DataRepr(DataReprMode.RAW_DECART)
+    data = data_repr.proccess(tmp_path / "semantic.csv", tmp_path / "raw.csv", None)
+    decart = data_repr.proccess_lazy(tmp_path / "semantic.csv", tmp_path / "raw.csv")
+
+    # sides are deduplicated: 3 site rows x 2 semantic rows
+    assert len(decart) == len(data) == 6
+
+    blocks = [decart.materialize(pair_ids) for pair_ids in decart.blocks(4)]
+    assert [len(block) for block in blocks] == [4, 2]
+    pd.testing.assert_frame_equal(
+        data.reset_index(drop=True),
+        pd.concat(blocks).reset_index(drop=True),
+    )
+
+    site_positions, semantic_positions = decart.pairs(blocks[1].index.to_numpy())
+    assert site_positions.tolist() == [2, 2]
+    assert semantic_positions.tolist() == [0, 1]
+
+    with pytest.raises(NotImplementedError):
+        DataRepr(DataReprMode.VALIDATION).proccess_lazy(None, None)
+
+
+def test_groupby_fill_category_region(tmp_path):
+    make_validation().to_csv(tmp_path / "validation.csv", index=False)
+    data = DataRepr(DataReprMode.VALIDATION).proccess(
+        None, None, tmp_path / "validation.csv"
+    )
+
+    data = GroupByValidator()._fill_region(data)
+    assert data[DATA.REGION].to_list() == ["Москва", "", "Москва"]
@@ -10,6 +10,8 @@ from vendor_code import (
     VendorCode,
     VendorCodeExtractor,
     VendorCodeSearch,
+    VendorCodeSearchMode,
+    VendorCodeIndex,
 )
 from notation import RAW, DATA, VENDOR_CODE
 
@@ -86,5 +88,94 @@ def test_vendor_code_search():
     assert result.sum() == 0
 
 
+def test_vectorized_search_equals_row_search():
+    original, extracted = VENDOR_CODE.TYPE.ORIGINAL, VENDOR_CODE.TYPE.EXTRACTED
+
+    data = pd.DataFrame(
+        data=[
+            [[VendorCode("ax-13.59.0", original)], "good1 AX-13.59.0", 0, 1],
+            [[VendorCode("ax-13.59.0", extracted)], "good1 ax1359-0", 1, 1],
+            [
+                [VendorCode("km-1", original), VendorCode("978-5", extracted)],
+                "good2 978.5 km1",  # the first matched code validates
+                0,
+                1,
+            ],
+            [[VendorCode("zz-99", original)], "good3 zz-98", 0, 1],
+            [[], "good4", 0, 1],
+            [None, "good4", 0, 0],
+        ],
+        columns=[DATA.VC, DATA.ROW, DATA.VALIDATION_STATUS, DATA.VALIDATED],
+        index=[10, 3, 7, 1, 0, 2],
+    )
+    data[VENDOR_CODE.VALIDATED] = 1
+
+    for skip_validated in [True, False]:
+        VC = VendorCodeSearch(skip_validated)
+        val, columns = VC.validate(data.copy(), None)
+
+        expected = data.copy()
+        if skip_validated:
+            expected = expected[expected[DATA.VALIDATION_STATUS] == 0]
+        expected = expected.apply(VC._validate, axis=1)
+
+        columns += [DATA.VALIDATION_STATUS]
+        assert val[columns].astype(object).equals(expected[columns].astype(object))
+
+    assert val[VENDOR_CODE.STATUS].to_list() == [
+        f"Validated by {original}",
+        f"Validated by {extracted}",
+        f"Validated by {original}",
+        "Not validated",
+        "No vendor code",
+        "No vendor code",
+    ]
+
+
+def test_vendor_code_index_equals_regex():
+    values = ["ax-13.59.0", "AB/12", "a--b", "-q-", "x+1", "ab"]
+    rxs = [VendorCode(value, VENDOR_CODE.TYPE.ORIGINAL).rx for value in values]
+    index = VendorCodeIndex(values)
+
+    rows = [
+        "good AX1359 0",
+        "ab 12 ab_12",
+        "a12b xx1",
+        "a\nb q",
+        "İ ab",
+        "",
+    ]
+    for row in rows:
+        expected = {
+            code for code, rx in enumerate(rxs) if re.search(rx, row, re.IGNORECASE)
+        }
+        assert index.findall(row) == expected
+
+
+def test_inverted_search_equals_regex_search():
+    type_ = VENDOR_CODE.TYPE.ORIGINAL
+    codes = ["ax-13.59.0", "km-1", "978-5", "zz-99"]
+    rows = ["good1 AX-13.59.0", "good2 978.5 km1", "good3 zz-98"]
+
+    # cross product of the codes and the rows
+    data = pd.DataFrame(
+        data=[[[VendorCode(code, type_)], row, 0, 0] for code in codes for row in rows],
+        columns=[DATA.VC, DATA.ROW, DATA.VALIDATION_STATUS, DATA.VALIDATED],
+    )
+    data[VENDOR_CODE.VALIDATED] = 1
+
+    regex = VendorCodeSearch(False, VendorCodeSearchMode.REGEX)
+    inverted = VendorCodeSearch(False, VendorCodeSearchMode.INVERTED)
+
+    val1, _ = regex.validate(data.copy(), None)
+    val2, _ = inverted.validate(data.copy(), None)
+
+    assert val1.equals(val2)
+    assert val2[VENDOR_CODE.VALIDATED].sum() == 3
+
+    with pytest.raises(ValueError):
+        VendorCodeSearch(search_mode="SomeMode")
+
+
 if __name__ == "__main__":
     test_vendor_code_search()
@@ -1,7 +1,10 @@
 import pandas as pd
 from abc import ABC, abstractmethod
+import json
+import time
 import warnings
 import numpy as np
+from pathlib import Path
 from typing import Union
 import regex as re
 from tqdm import tqdm
@@ -10,6 +13,7 @@ import multiprocessing
 tqdm.pandas()
 
 from notation import DATA, FEATURES
+from cache import BoundedCache
 from features_collection import (
     AbstractFeature,
     FutureList,
@@ -23,6 +27,181 @@ from features_collection import (
 warnings.filterwarnings("ignore")
 
 
+class FeatureSearchMode(object):
+    """
+    How the rows are scanned for the features (the output is the same).
+
+    - SEPARATE - findall of every designation of the feature
+    - FUSED - one scan of the row per feature (FusedScanner)
+
+    There is no single scan for all features: the regex engine tries every
+    branch of the joined alternation at every position, and the features,
+    which overlap at the position, need the extra lookaheads, so it is
+    slower than FUSED (benchmarks/bench_text_feature.py).
+    """
+
+    SEPARATE = "separate"
+    FUSED = "fused"
+
+
+class FeatureSide(object):
+    CLIENT = 0
+    SOURCE = 1
+
+
+class FusedScanner(object):
+    """
+    Search of several designations by one scan of the row.
+
+    The fused lookahead regex finds the candidate positions, where any
+    designation can match. Every designation is tried only at these
+    positions and continues from the end of its previous match,
+    like findall does.
+
+    - designations - measures or types of the features
+    - candidates_regex - regex, which matches at least at every position
+    where any designation matches (alternation of designations by default)
+    """
+
+    def __init__(
+        self,
+        designations: list[Union[Measure, Type]],
+        candidates_regex: str = "",
+    ) -> None:
+        self.designations = designations
+        for designation in self.designations:
+            designation.compile()
+
+        if not candidates_regex:
+            candidates_regex = "|".join(
+                f"(?:{designation.regex})" for designation in self.designations
+            )
+
+        self.candidates_regex = candidates_regex
+        self.patterns = [designation.compiled for designation in self.designations]
+        self.fused = self._compile(candidates_regex)
+
+    def _compile(self, candidates_regex: str) -> re.Pattern:
+        try:
+            return re.compile(f"(?=(?:{candidates_regex}))", re.IGNORECASE)
+        except re.error:
+            # numbered backreferences and so on can't be fused
+            return None
+
+    def _findall(self, row: str) -> list[list]:
+        return [pattern.findall(row) for pattern in self.patterns]
+
+    def _group(self, match: re.Match, pattern: re.Pattern) -> Union[str, tuple]:
+        """Return value of the match as findall does"""
+        if pattern.groups == 0:
+            return match.group(0)
+
+        groups = match.groups("")
+        return groups[0] if pattern.groups == 1 else groups
+
+    def _match_at(
+        self,
+        row: str,
+        position: int,
+        output: list[list],
+        next_positions: list[int],
+    ) -> bool:
+        """
+        Add matches of the designations at the candidate position.
+        Return False if there is an empty match (handled by findall only).
+        """
+        for index, pattern in enumerate(self.patterns):
+            if next_positions[index] > position:
+                continue
+
+            match = pattern.match(row, position)
+            if match is None:
+                continue
+            if match.end() == position:
+                return False
+
+            output[index].append(self._group(match, pattern))
+            next_positions[index] = match.end()
+
+        return True
+
+    def findall(self, row: str) -> list[list]:
+        """Return findall output of every designation"""
+
+        row = str(row)
+        if self.fused is None:
+            return self._findall(row)
+
+        output = [[] for _ in self.patterns]
+        next_positions = [0] * len(self.patterns)
+        for candidate in self.fused.finditer(row):
+            if not self._match_at(row, candidate.start(), output, next_positions):
+                return self._findall(row)
+
+        return output
+
+
+class CascadeScheduler(object):
+    """
+    Order of the features for the cascade (skip_intermediate_validated=True).
+
+    Features, which reject more rows per second of their search and
+    validation, go first, so the rows are rejected by the cheap features.
+    The rejected rows and the spent time of every feature are summed over
+    the runs and kept in the JSON stats file. Features without stats keep
+    their order and go first.
+
+    - stats_path - JSON file of the stats (loaded on init if exists,
+    saved by save())
+    """
+
+    def __init__(self, stats_path: Union[str, Path, None] = None) -> None:
+        self.stats_path = stats_path
+        self.stats = {}
+
+        if self.stats_path is not None:
+            self.load()
+
+    def _rejection_per_cost(self, feature: AbstractFeature) -> float:
+        stats = self.stats.get(feature.NAME)
+        if not stats or not stats["seconds"]:
+            return float("inf")
+        return stats["rejected"] / stats["seconds"]
+
+    def order(self, features: list[AbstractFeature]) -> list[AbstractFeature]:
+        return sorted(features, key=lambda feature: -self._rejection_per_cost(feature))
+
+    def update(
+        self,
+        feature: AbstractFeature,
+        rows: int,
+        rejected: int,
+        seconds: float,
+    ) -> None:
+        stats = self.stats.setdefault(
+            feature.NAME,
+            {"rows": 0, "rejected": 0, "seconds": 0.0},
+        )
+        stats["rows"] += rows
+        stats["rejected"] += rejected
+        stats["seconds"] += seconds
+
+    def load(self) -> None:
+        path = Path(self.stats_path)
+        if not path.exists():
+            return
+
+        with open(path, "r", encoding="utf-8") as file:
+            self.stats = json.load(file)
+
+    def save(self) -> None:
+        if self.stats_path is None:
+            raise ValueError("Stats path isn't set")
+
+        with open(self.stats_path, "w", encoding="utf-8") as file:
+            json.dump(self.stats, file, ensure_ascii=False, indent=4)
+
+
 class AbstractTextFeatureSearch(ABC):
     def __init__(self) -> None:
         pass
@@ -38,11 +217,56 @@ class TextFeatureSearch(AbstractTextFeatureSearch):
         skip_validated: bool = True,
         skip_intermediate_validated: bool = True,
         custom_features_list: list[AbstractFeature] = [],
+        search_mode: FeatureSearchMode = FeatureSearchMode.SEPARATE,
+        cache: Union[BoundedCache, None] = None,
+        fixed_point: bool = False,
+        output_features: bool = True,
+        scheduler: Union[CascadeScheduler, None] = None,
     ) -> None:
+        """
+        - search_mode - FeatureSearchMode.SEPARATE scans the rows by every
+        designation of the feature, FeatureSearchMode.FUSED scans the rows
+        once per feature (with the same output)
+        - cache - found features of the distinct rows, keyed by the
+        futures version (shared by runs, if the cache has a path)
+        - fixed_point - numerical features keep integer fixed-point values
+        instead of Decimal (the same validation)
+        - output_features - make lists of the found features for the output
+        (FEATURES.CLIENT and FEATURES.SOURCE), all found features are kept
+        in the long features_table anyway
+        - scheduler - order of the features for skip_intermediate_validated
+        cascade (the rows are rejected by the first failed feature)
+        """
+        if search_mode not in [
+            FeatureSearchMode.SEPARATE,
+            FeatureSearchMode.FUSED,
+        ]:
+            raise ValueError("Unknown feature search mode")
+
+        if scheduler is not None and not skip_intermediate_validated:
+            raise ValueError(
+                "Cascade scheduler works with skip_intermediate_validated only"
+            )
+
         self.skip_validated = skip_validated
         self.skip_intermediate_validated = skip_intermediate_validated
+        self.search_mode = search_mode
+        self.cache = cache
+        self.fixed_point = fixed_point
+        self.output_features = output_features
+        self.features_table = None
+        self.scheduler = scheduler
 
         self.futures = FutureList(custom_features_list)
+        self.scanners = {}
+        if self.search_mode == FeatureSearchMode.FUSED:
+            self.scanners = {
+                feature: FusedScanner(
+                    list(feature.designations),
+                    feature.designations.candidates_regex(),
+                )
+                for feature in self.futures
+            }
 
     def _preproccess(
         self,
@@ -50,11 +274,11 @@ class TextFeatureSearch(AbstractTextFeatureSearch):
         feature: AbstractFeature,
         measure: Measure,
     ) -> list:
-        return [feature(value, measure) for value in values]
+        return [feature(value, measure, self.fixed_point) for value in values]
 
-    def _findall(self, row: str, rx: str) -> list[str]:
+    def _findall(self, row: str, rx: re.Pattern) -> list[str]:
         row = str(row)
-        output = re.findall(rx, row, re.IGNORECASE)
+        output = rx.findall(row)
         return output
 
     def _feature_search(
@@ -65,24 +289,183 @@ class TextFeatureSearch(AbstractTextFeatureSearch):
         progress_for: str,
     ) -> pd.Series:
         # print("Search features", progress_for, feature.NAME)
-        series = series.apply(self._findall, args=(designation.regex,))
+        series = series.apply(self._findall, args=(designation.compiled,))
         series = series.apply(self._preproccess, args=(feature, designation))
         return series
 
+    def _fused_findall(
+        self,
+        row: str,
+        feature: AbstractFeature,
+        scanner: FusedScanner,
+    ) -> list:
+        values = scanner.findall(row)
+        return [
+            feature(value, designation, self.fixed_point)
+            for designation, designation_values in zip(scanner.designations, values)
+            for value in designation_values
+        ]
+
+    def _row_features(self, row: str, feature: AbstractFeature) -> tuple:
+        """Return features of the row found by the search mode"""
+
+        if self.search_mode == FeatureSearchMode.FUSED:
+            return tuple(self._fused_findall(row, feature, self.scanners[feature]))
+
+        return tuple(
+            value
+            for designation in feature.designations
+            for value in self._preproccess(
+                self._findall(row, designation.compiled),
+                feature,
+                designation,
+            )
+        )
+
+    def _cached_row_features(self, row: str, feature: AbstractFeature) -> tuple:
+        if self.cache is None or not isinstance(row, str):
+            return self._row_features(row, feature)
+
+        key = (self.futures.version, self.fixed_point, feature.NAME, row)
+        found = self.cache.get(key)
+        if found is None:
+            found = self._row_features(row, feature)
+            self.cache.set(key, found)
+        return found
+
+    def row_features(self, row: str) -> dict[str, tuple]:
+        """Features of the row by the features names (cached as in validate)"""
+        return {
+            feature.NAME: self._cached_row_features(row, feature)
+            for feature in self.futures
+        }
+
+    def _side_table(
+        self,
+        rows: np.ndarray,
+        row_ids: pd.Index,
+        feature: AbstractFeature,
+        side: int,
+    ) -> pd.DataFrame:
+        """
+        Search features in the distinct rows only and broadcast them
+        back to every row as the long table (one table row per found feature).
+        """
+        codes, uniques = pd.factorize(rows, use_na_sentinel=False)
+        found = [self._cached_row_features(row, feature) for row in uniques]
+
+        lengths = np.array([len(features) for features in found], dtype=int)
+        features = [value for code in codes for value in found[code]]
+
+        return pd.DataFrame(
+            {
+                FEATURES.ROW_ID: np.repeat(row_ids.to_numpy(), lengths[codes]),
+                FEATURES.SIDE: side,
+                FEATURES.VALUE: pd.Series(
+                    [value.standard_value for value in features],
+                    dtype=object,
+                ),
+                FEATURES.FEATURE: pd.Series(features, dtype=object),
+            }
+        )
+
+    def _feature_table(
+        self,
+        client: np.ndarray,
+        source: np.ndarray,
+        row_ids: pd.Index,
+        feature: AbstractFeature,
+        feature_id: int,
+    ) -> pd.DataFrame:
+        table = pd.concat(
+            [
+                self._side_table(client, row_ids, feature, FeatureSide.CLIENT),
+                self._side_table(source, row_ids, feature, FeatureSide.SOURCE),
+            ],
+            ignore_index=True,
+        )
+        table[FEATURES.FEATURE_ID] = feature_id
+        return table[
+            [
+                FEATURES.ROW_ID,
+                FEATURES.SIDE,
+                FEATURES.FEATURE_ID,
+                FEATURES.VALUE,
+                FEATURES.FEATURE,
+            ]
+        ]
+
+    def _empty_table(self) -> pd.DataFrame:
+        return self._feature_table(
+            np.array([], dtype=object),
+            np.array([], dtype=object),
+            pd.Index([]),
+            None,
+            -1,
+        )
+
+    def _table_counts(
+        self,
+        table: pd.DataFrame,
+        index: pd.Index,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Count distinct client and source values of the feature
+        and their intersection for every row of the index.
+        Features of one feature are equal if their standard values are equal.
+        """
+        rows = index.get_indexer(table[FEATURES.ROW_ID])
+        sides = table[FEATURES.SIDE].to_numpy(dtype=np.int64)
+        values = pd.factorize(table[FEATURES.VALUE])[0].astype(np.int64)
+        values_count = int(values.max()) + 1 if len(values) else 1
+
+        # distinct (row, side, value) triples
+        keys = np.unique((rows * 2 + sides) * values_count + values)
+        rows_sides, values = np.divmod(keys, values_count)
+        rows, sides = np.divmod(rows_sides, 2)
+
+        client = sides == FeatureSide.CLIENT
+        source = sides == FeatureSide.SOURCE
+        both = np.intersect1d(
+            (rows * values_count + values)[client],
+            (rows * values_count + values)[source],
+            assume_unique=True,
+        )
+
+        return (
+            np.bincount(rows[client], minlength=len(index)),
+            np.bincount(rows[source], minlength=len(index)),
+            np.bincount(both // values_count, minlength=len(index)),
+        )
+
+    @property
+    def cache_stats(self) -> dict:
+        if self.cache is None:
+            return {}
+        return self.cache.stats
+
     def _determine_based_intersection(
         self,
         cif: set,
         sif: set,
         val_mode: FeatureValidationMode,
     ) -> int:
+        return self._determine_based_count(len(cif), len(sif), val_mode)
+
+    def _determine_based_count(
+        self,
+        client: Union[int, np.ndarray],
+        source: Union[int, np.ndarray],
+        val_mode: FeatureValidationMode,
+    ) -> Union[int, np.ndarray]:
         if val_mode is FeatureValidationMode.MODEST:
-            based = min(len(cif), len(sif))
+            based = np.minimum(client, source)
         elif val_mode is FeatureValidationMode.CLIENT:
-            based = len(cif)
+            based = client
         elif val_mode is FeatureValidationMode.SOURCE:
-            based = len(sif)
+            based = source
         else:  # val_mode is FeatureValidationMode.STRICT
-            based = max(len(cif), len(sif))
+            based = np.maximum(client, source)
         return based
 
     def _old_intermediate_validation(
@@ -117,126 +500,121 @@ class TextFeatureSearch(AbstractTextFeatureSearch):
 
         return row
 
-    def _intermediate_validation_func(self, row: list[Union[int, set]]) -> list[int]:
-        desicion = row[0]
-        if desicion == 1:
-            cif = row[1]
-            sif = row[2]
-
-            not_found_status = NotFoundStatus(
-                cif,
-                sif,
-                self.__not_found_mode,
-                self.__feature_name,
-            )
-
-            if not_found_status:
-                desicion = not_found_status.desicion
-                return desicion
-
-            based = self._determine_based_intersection(cif, sif, self.__val_mode)
-            intersect = cif.intersection(sif)
-            desicion = desicion if len(intersect) == based else 0
-
-        return desicion
-
     def _intermediate_validation(
         self,
         data: pd.DataFrame,
+        table: pd.DataFrame,
         feature: AbstractFeature,
     ) -> pd.DataFrame:
-        cif_massive = map(set, data[FEATURES.CI].to_list())
-        sif_massive = map(set, data[FEATURES.SI].to_list())
-        intermediate = data[FEATURES.INTERMEDIATE_VALIDATION].to_list()
-
-        self.__not_found_mode = feature.NOT_FOUND_MODE
-        self.__feature_name = feature.NAME
-        self.__val_mode = feature.VALIDATION_MODE
-
-        massive = list(zip(intermediate, cif_massive, sif_massive))
-        desicions = list(map(self._intermediate_validation_func, tqdm(massive)))
-        data[FEATURES.INTERMEDIATE_VALIDATION] = desicions
-
-        return data
-
-    def _hand_over_features(
-        self,
-        data: pd.DataFrame,
-        new_data: pd.DataFrame,
-    ) -> pd.DataFrame:
-        data.loc[new_data.index, FEATURES.CLIENT] += new_data[FEATURES.CI]
-        data.loc[new_data.index, FEATURES.SOURCE] += new_data[FEATURES.SI]
+        data[FEATURES.INTERMEDIATE_VALIDATION] = self._validate_rows(
+            data.index,
+            data[FEATURES.INTERMEDIATE_VALIDATION].to_numpy(),
+            table,
+            feature,
+        )
         return data
 
-    def _hand_over_intermediate(
+    def _validate_rows(
         self,
-        data: pd.DataFrame,
-        new_data: pd.DataFrame,
-    ) -> pd.DataFrame:
-        data.loc[
-            new_data.index,
-            [
-                FEATURES.STATUS,
-                FEATURES.INTERMEDIATE_VALIDATION,
-                FEATURES.NOT_FOUND,
-            ],
-        ] = new_data[
-            [
-                FEATURES.STATUS,
-                FEATURES.INTERMEDIATE_VALIDATION,
-                FEATURES.NOT_FOUND,
-            ]
-        ]
-        return data
-
-    def _extract(self, data: pd.DataFrame) -> pd.DataFrame:
-        cur_df = data[:]  # current working dataframe
+        row_ids: pd.Index,
+        intermediate: np.ndarray,
+        table: pd.DataFrame,
+        feature: AbstractFeature,
+    ) -> np.ndarray:
+        """Return intermediate decisions of the rows by the feature"""
 
-        for feature in self.futures:
-            feature: AbstractFeature
+        client, source, intersection = self._table_counts(table, row_ids)
 
-            cur_df[FEATURES.CI] = [[] for _ in range(len(cur_df))]
-            cur_df[FEATURES.SI] = [[] for _ in range(len(cur_df))]
+        # decisions of NotFoundStatus don't depend on the rows
+        both_not_found = NotFoundStatus(
+            set(), set(), feature.NOT_FOUND_MODE, feature.NAME
+        ).desicion
+        one_not_found = NotFoundStatus(
+            set(), {None}, feature.NOT_FOUND_MODE, feature.NAME
+        ).desicion
 
-            for designation in feature.designations:
-                cif = self._feature_search(
-                    cur_df[DATA.CLIENT_NAME],
-                    feature,
-                    designation,
-                    progress_for="client",
-                )
-                sif = self._feature_search(
-                    cur_df[DATA.ROW],
-                    feature,
-                    designation,
-                    progress_for="source",
-                )
+        based = self._determine_based_count(client, source, feature.VALIDATION_MODE)
+        return np.select(
+            [
+                intermediate != 1,
+                (client == 0) & (source == 0),
+                (client == 0) | (source == 0),
+                intersection == based,
+            ],
+            [intermediate, both_not_found, one_not_found, intermediate],
+            default=0,
+        )
 
-                cur_df[FEATURES.CI] += cif
-                cur_df[FEATURES.SI] += sif
+    def features_lists(self, index: pd.Index, side: int) -> list[list]:
+        """Materialize lists of the found features of the side for the rows"""
+        table = self.features_table
+        table = table[table[FEATURES.SIDE] == side]
+        lists = table.groupby(FEATURES.ROW_ID, sort=False)[FEATURES.FEATURE].agg(list)
+        lists = lists.reindex(index)
+        return [value if isinstance(value, list) else [] for value in lists]
 
-            cur_df = self._intermediate_validation(cur_df, feature)
+    def _ordered_futures(self) -> list[AbstractFeature]:
+        futures = list(self.futures)
+        if self.scheduler is not None:
+            futures = self.scheduler.order(futures)
+        return futures
 
-            # cur_df = cur_df.progress_apply(
-            #     self._old_intermediate_validation,
-            #     axis=1,
-            #     args=(
-            #         feature.VALIDATION_MODE,
-            #         feature.NOT_FOUND_MODE,
-            #         feature.NAME,
-            #     ),
-            # )
+    def _extract(self, data: pd.DataFrame) -> pd.DataFrame:
+        """
+        Search and validate the features feature by feature. With
+        skip_intermediate_validated only not rejected rows are searched
+        (the rows are kept as positions, rejected rows aren't touched).
+        """
+        client = data[DATA.CLIENT_NAME].to_numpy()
+        source = data[DATA.ROW].to_numpy()
+        status = data[FEATURES.STATUS].to_numpy(dtype=object, copy=True)
+        intermediate = data[FEATURES.INTERMEDIATE_VALIDATION].to_numpy(copy=True)
+
+        rows = np.arange(len(data))  # positions of the current rows
+        feature_ids = {feature: index for index, feature in enumerate(self.futures)}
+        tables = {}
+
+        for feature in self._ordered_futures():
+            feature: AbstractFeature
+            if not len(rows):
+                break
+
+            start = time.perf_counter()
+            row_ids = data.index[rows]
+
+            table = self._feature_table(
+                client[rows],
+                source[rows],
+                row_ids,
+                feature,
+                feature_ids[feature],
+            )
+            desicions = self._validate_rows(row_ids, intermediate[rows], table, feature)
 
-            cur_df.loc[
-                cur_df[FEATURES.INTERMEDIATE_VALIDATION] == 0,
-                FEATURES.STATUS,
-            ] = f"Not validated by {feature.NAME}"
+            intermediate[rows] = desicions
+            status[rows[desicions == 0]] = f"Not validated by {feature.NAME}"
 
             if self.skip_intermediate_validated:
-                cur_df = cur_df[cur_df[FEATURES.INTERMEDIATE_VALIDATION] == 1]
+                rejected = int(np.count_nonzero(desicions == 0))
+                rows = rows[desicions == 1]
+                # features of the rejected rows are kept up to the previous feature
+                table = table[table[FEATURES.ROW_ID].isin(data.index[rows])]
+
+                if self.scheduler is not None:
+                    seconds = time.perf_counter() - start
+                    self.scheduler.update(feature, len(row_ids), rejected, seconds)
+
+            tables[feature_ids[feature]] = table
+
+        data[FEATURES.STATUS] = status
+        data[FEATURES.INTERMEDIATE_VALIDATION] = intermediate
+        self.features_table = pd.concat(
+            [tables[index] for index in sorted(tables)] or [self._empty_table()],
+            ignore_index=True,
+        )
 
-            data = self._hand_over_features(data, cur_df)
-        data = self._hand_over_intermediate(data, cur_df)
+        if self.scheduler is not None and self.scheduler.stats_path is not None:
+            self.scheduler.save()
 
         return data
 
@@ -251,11 +629,13 @@ class TextFeatureSearch(AbstractTextFeatureSearch):
         data[FEATURES.STATUS] = ""
         data[FEATURES.INTERMEDIATE_VALIDATION] = 1
 
-        data.loc[:, FEATURES.CLIENT] = [[] for _ in range(len(data))]
-        data.loc[:, FEATURES.SOURCE] = [[] for _ in range(len(data))]
-
         data = self._extract(data)
 
+        if self.cache is not None:
+            print("Features cache:", self.cache.stats)
+            if self.cache.path is not None:
+                self.cache.save()
+
         data[DATA.VALIDATED] = np.where(
             data[FEATURES.INTERMEDIATE_VALIDATION] == 1,
             data[DATA.VALIDATED],
@@ -273,15 +653,15 @@ class TextFeatureSearch(AbstractTextFeatureSearch):
             data[FEATURES.VALIDATED],
             0,
         )
+        data.attrs[FEATURES.CACHE_STATS] = self.cache_stats
 
-        return data, [
-            DATA.VALIDATED,
-            FEATURES.STATUS,
-            FEATURES.VALIDATED,
-            FEATURES.CLIENT,
-            FEATURES.SOURCE,
-            FEATURES.NOT_FOUND,
-        ]
+        columns = [DATA.VALIDATED, FEATURES.STATUS, FEATURES.VALIDATED]
+        if self.output_features:
+            data[FEATURES.CLIENT] = self.features_lists(data.index, FeatureSide.CLIENT)
+            data[FEATURES.SOURCE] = self.features_lists(data.index, FeatureSide.SOURCE)
+            columns += [FEATURES.CLIENT, FEATURES.SOURCE]
+
+        return data, columns + [FEATURES.NOT_FOUND]
 
 
 if __name__ == "__main__":
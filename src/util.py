@@ -1,8 +1,11 @@
 import pandas as pd
+import numpy as np
 import re
+from pathlib import Path
+from typing import Union
 
 
-from notation import RAW, SEMANTIC, DATA, PATH
+from notation import RAW, SEMANTIC, DATA, PATH, CANDIDATES
 from vendor_code import VendorCodeSearch, VendorCodeExtractor
 
 
@@ -18,20 +21,314 @@ class DataReprMode(object):
     RAW_DECART = "decart"
 
 
+class DataFormat(object):
+    EXCEL = "excel"
+    CSV = "csv"
+    PARQUET = "parquet"
+    FEATHER = "feather"
+
+    @classmethod
+    @property
+    def suffixes(self):
+        return {
+            ".xlsx": self.EXCEL,
+            ".xls": self.EXCEL,
+            ".csv": self.CSV,
+            ".parquet": self.PARQUET,
+            ".pq": self.PARQUET,
+            ".feather": self.FEATHER,
+            ".arrow": self.FEATHER,
+        }
+
+    @classmethod
+    def from_path(self, path: Union[str, Path]) -> str:
+        suffix = Path(path).suffix.lower()
+        if suffix not in self.suffixes:
+            raise NotImplementedError(f"Unknown data format: {suffix}")
+        return self.suffixes[suffix]
+
+
+def _select_columns(names: list[str], columns: Union[list[str], None]) -> list[str]:
+    if columns is None:
+        return names
+    return [name for name in names if name in columns]
+
+
+def _csv_dtype() -> dict:
+    # text columns aren't parsed as numbers (e.g. vendor codes)
+    dtype = {
+        column: str for column in DATA.raw_cols + DATA.sem_cols + DATA.columns_order
+    }
+    dtype.update({column: "category" for column in DATA.category_cols})
+    return dtype
+
+
+def _set_categories(data: pd.DataFrame) -> pd.DataFrame:
+    for column in DATA.category_cols:
+        if column in data.columns:
+            data[column] = data[column].astype("category")
+    return data
+
+
+def _str_objects(data: pd.DataFrame) -> pd.DataFrame:
+    """
+    Columnar formats need one type per column: e.g. vendor codes
+    are numbers and strings in the same excel column
+    """
+    for column in data.columns:
+        if data[column].dtype == object:
+            data[column] = data[column].where(
+                data[column].isna(),
+                data[column].astype(str),
+            )
+    return data
+
+
+def read_data(
+    path: Union[str, Path],
+    columns: Union[list[str], None] = None,
+) -> pd.DataFrame:
+    """
+    Read the data file, the format is selected by the extension (DataFormat).
+
+    - columns - load only these columns (missing in the file are skipped),
+    None - load all columns
+    """
+    data_format = DataFormat.from_path(path)
+    usecols = None if columns is None else (lambda column: column in columns)
+
+    match data_format:
+        case DataFormat.EXCEL:
+            data = pd.read_excel(path, usecols=usecols)
+        case DataFormat.CSV:
+            data = pd.read_csv(path, usecols=usecols, dtype=_csv_dtype())
+        case DataFormat.PARQUET:
+            import pyarrow.parquet
+
+            names = pyarrow.parquet.read_schema(path).names
+            data = pd.read_parquet(path, columns=_select_columns(names, columns))
+        case DataFormat.FEATHER:
+            import pyarrow.ipc
+
+            with pyarrow.ipc.open_file(path) as reader:
+                names = reader.schema.names
+            data = pd.read_feather(path, columns=_select_columns(names, columns))
+
+    return _set_categories(data)
+
+
+def _iter_excel(
+    path: Union[str, Path],
+    columns: Union[list[str], None],
+    chunk_size: int,
+):
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = list(next(rows, []))
+        names = _select_columns(header, columns)
+
+        chunk = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            chunk.append(row)
+            if len(chunk) == chunk_size:
+                yield pd.DataFrame(chunk, columns=header)[names]
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=header)[names]
+    finally:
+        workbook.close()
+
+
+def iter_data(
+    path: Union[str, Path],
+    columns: Union[list[str], None] = None,
+    chunk_size: int = 100_000,
+):
+    """
+    Read the data file by chunks of chunk_size rows (see read_data).
+    Index of the chunks continues the index of the previous chunks.
+    """
+    if chunk_size <= 0:
+        raise ValueError("Chunk size should be positive")
+
+    data_format = DataFormat.from_path(path)
+    usecols = None if columns is None else (lambda column: column in columns)
+
+    match data_format:
+        case DataFormat.EXCEL:
+            chunks = _iter_excel(path, columns, chunk_size)
+        case DataFormat.CSV:
+            chunks = pd.read_csv(
+                path,
+                usecols=usecols,
+                dtype=_csv_dtype(),
+                chunksize=chunk_size,
+            )
+        case DataFormat.PARQUET:
+            import pyarrow.parquet
+
+            file = pyarrow.parquet.ParquetFile(path)
+            names = _select_columns(file.schema_arrow.names, columns)
+            chunks = (
+                batch.to_pandas()
+                for batch in file.iter_batches(batch_size=chunk_size, columns=names)
+            )
+        case DataFormat.FEATHER:
+            import pyarrow
+            import pyarrow.ipc
+
+            # memory mapped file: batches are read on demand
+            table = pyarrow.ipc.open_file(pyarrow.memory_map(str(path))).read_all()
+            table = table.select(_select_columns(table.schema.names, columns))
+            chunks = (
+                batch.to_pandas()
+                for batch in table.to_batches(max_chunksize=chunk_size)
+            )
+
+    start = 0
+    for data in chunks:
+        data.index = pd.RangeIndex(start, start + len(data))
+        start += len(data)
+        yield _set_categories(data)
+
+
+def convert_data(
+    path: Union[str, Path],
+    data_format: DataFormat = DataFormat.PARQUET,
+) -> Path:
+    """
+    Convert the data file (e.g. .xlsx archive) into data_format once,
+    so it can be read without parsing the workbook. All columns are kept.
+    Returns the path of the converted file (near the original one).
+    """
+    suffixes = {
+        DataFormat.CSV: ".csv",
+        DataFormat.PARQUET: ".parquet",
+        DataFormat.FEATHER: ".feather",
+    }
+    if data_format not in suffixes:
+        raise NotImplementedError(f"Can't convert to {data_format}")
+    output_path = Path(path).with_suffix(suffixes[data_format])
+
+    data = _str_objects(read_data(path))
+
+    match data_format:
+        case DataFormat.CSV:
+            data.to_csv(output_path, index=False)
+        case DataFormat.PARQUET:
+            data.to_parquet(output_path, index=False)
+        case DataFormat.FEATHER:
+            data.to_feather(output_path)
+    return output_path
+
+
+class LazyDecart(object):
+    """
+    Cartesian product of the site rows and the semantic rows, which isn't
+    materialized: every side is stored once (already renamed and expanded),
+    the pairs are materialized by blocks of pair ids.
+
+    Pair id = site position * len(semantic) + semantic position.
+
+    - site - site side rows (DataRepr._decart_sides)
+    - semantic - semantic side rows
+    - labels - pair ids of the pairs marked by MyMark (if known)
+    - site_brands, semantic_brands - brands of the sides rows for
+    CandidateGenerator (if known), they aren't materialized
+    """
+
+    def __init__(
+        self,
+        site: pd.DataFrame,
+        semantic: pd.DataFrame,
+        labels: Union[np.ndarray, None] = None,
+        site_brands: Union[pd.Series, None] = None,
+        semantic_brands: Union[pd.Series, None] = None,
+    ) -> None:
+        self.site = site.reset_index(drop=True)
+        self.semantic = semantic.reset_index(drop=True)
+        self.labels = labels
+
+        self.site_brands, self.semantic_brands = None, None
+        if site_brands is not None:
+            self.site_brands = site_brands.reset_index(drop=True)
+        if semantic_brands is not None:
+            self.semantic_brands = semantic_brands.reset_index(drop=True)
+
+        columns = list(self.site.columns) + list(self.semantic.columns)
+        not_in_order = [col for col in columns if col not in DATA.columns_order]
+        self.columns = DATA.columns_order + not_in_order
+
+    def __len__(self) -> int:
+        return len(self.site) * len(self.semantic)
+
+    def pairs(self, pair_ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Return site positions and semantic positions of the pairs"""
+        return np.divmod(pair_ids, len(self.semantic))
+
+    def blocks(
+        self,
+        block_size: int = 100_000,
+        pair_ids: Union[np.ndarray, None] = None,
+    ):
+        """
+        Yield pair ids by blocks of block_size pairs
+
+        - pair_ids - pairs to yield (e.g. CandidateGenerator candidates),
+        None - all pairs
+        """
+        if block_size <= 0:
+            raise ValueError("Block size should be positive")
+
+        if pair_ids is not None:
+            for start in range(0, len(pair_ids), block_size):
+                yield pair_ids[start : start + block_size]
+            return
+
+        for start in range(0, len(self), block_size):
+            yield np.arange(start, min(start + block_size, len(self)), dtype=np.int64)
+
+    def materialize(self, pair_ids: np.ndarray) -> pd.DataFrame:
+        """Rows of the pairs (as DataRepr.proccess), index is the pair ids"""
+        site_positions, semantic_positions = self.pairs(pair_ids)
+
+        data = pd.concat(
+            [
+                self.site.take(site_positions).reset_index(drop=True),
+                self.semantic.take(semantic_positions).reset_index(drop=True),
+            ],
+            axis=1,
+        )
+        data.index = pd.Index(pair_ids)
+        return data[self.columns]
+
+
 class DataRepr(object):
     """
     Данные могут быть представлены в двух видах:
     1. Обычный вид валидационного файла
     2. Сырые данные и семантика, превращенные валидационный файл
     3. Декартово множество
+
+    Файлы читаются по расширению (DataFormat): xlsx, csv, parquet, feather.
+
+    - project_columns - load only used columns of the files
+    (DATA.sem_cols, DATA.raw_cols, DATA.validation_cols)
     """
 
     def __init__(
         self,
         mode: DataReprMode,
         # VCExtractor: VendorCodeExtractor,
+        project_columns: bool = True,
     ) -> None:
         self.mode = self._checkout_mode(mode)
+        self.project_columns = project_columns
         # self.VCExtractor = VCExtractor
 
     def _checkout_mode(self, mode: str) -> str:
@@ -70,11 +367,11 @@ class DataRepr(object):
     def _extract_domain(self, data: pd.DataFrame) -> pd.DataFrame:
         return extract_domain(data)
 
-    def _decart_mode(
+    def _decart_sides(
         self,
         semantic: pd.DataFrame,
         raw: pd.DataFrame,
-    ) -> pd.DataFrame:
+    ) -> tuple[pd.DataFrame, pd.DataFrame]:
         _semantic = semantic.drop_duplicates(
             subset=[
                 SEMANTIC.NAME,
@@ -89,10 +386,62 @@ class DataRepr(object):
             ]
         )[DATA.raw_cols]
 
+        return _validation, _semantic
+
+    def _decart_labels(
+        self,
+        site: pd.DataFrame,
+        semantic: pd.DataFrame,
+        raw: pd.DataFrame,
+    ) -> Union[np.ndarray, None]:
+        """Pair ids of the raw rows marked by MyMark (site row and query)"""
+
+        if RAW.MYMARK not in raw.columns:
+            return None
+
+        keys = [RAW.SOURCE, RAW.ROW]
+        site_positions = raw.loc[site.index, keys]
+        site_positions[CANDIDATES.SITE_POSITION] = np.arange(len(site))
+        semantic_positions = pd.DataFrame(
+            {
+                SEMANTIC.QUERY: semantic[SEMANTIC.QUERY].astype(object).to_numpy(),
+                CANDIDATES.SEMANTIC_POSITION: np.arange(len(semantic)),
+            }
+        )
+
+        marked = raw.loc[raw[RAW.MYMARK] == 1, keys + [RAW.QUERY]]
+        marked[RAW.QUERY] = marked[RAW.QUERY].astype(object)
+        pairs = marked.merge(site_positions, on=keys).merge(
+            semantic_positions,
+            left_on=RAW.QUERY,
+            right_on=SEMANTIC.QUERY,
+        )
+        return np.unique(
+            pairs[CANDIDATES.SITE_POSITION].to_numpy(dtype=np.int64) * len(semantic)
+            + pairs[CANDIDATES.SEMANTIC_POSITION].to_numpy(dtype=np.int64)
+        )
+
+    def _decart_mode(
+        self,
+        semantic: pd.DataFrame,
+        raw: pd.DataFrame,
+    ) -> pd.DataFrame:
+        _validation, _semantic = self._decart_sides(semantic, raw)
+
         data = _validation.merge(_semantic, how="cross")
         # TODO: нужно проверить декартово множество на рациональность
+        # (для больших файлов - proccess_lazy)
         return self._change_columns(data)
 
+    def _change_side(self, side: pd.DataFrame) -> pd.DataFrame:
+        side = side.drop([col for col in DATA.to_drop if col in side.columns], axis=1)
+        side = side.rename(columns=DATA.rename)
+
+        for column in [DATA.ROW, DATA.CLIENT_NAME]:
+            if column in side.columns:
+                side = self._expand_str_column(side, column)
+        return side
+
     def _change_columns(self, data: pd.DataFrame) -> pd.DataFrame:
         data = data.drop(DATA.to_drop, axis=1)
         data = data.rename(columns=DATA.rename)
@@ -101,17 +450,25 @@ class DataRepr(object):
         data = data[DATA.columns_order + not_in_order]
         return data
 
-    def _upload_data(self, path: str) -> pd.DataFrame:
-        return pd.read_excel(path)
+    def _upload_data(self, path: str, columns: list[str]) -> pd.DataFrame:
+        return read_data(path, columns if self.project_columns else None)
+
+    def _upload_raw(
+        self,
+        semantic_path: str,
+        raw_path: str,
+    ) -> tuple[pd.DataFrame, pd.DataFrame]:
+        semantic = self._upload_data(semantic_path, DATA.sem_cols + [SEMANTIC.BRAND])
+        raw = self._upload_data(raw_path, DATA.raw_cols + [RAW.MYMARK, RAW.BRAND])
+        raw = self._extract_domain(raw)
+        return semantic, raw
 
     def _process_raw(
         self,
         semantic_path: str,
         raw_path: str,
     ) -> pd.DataFrame:
-        semantic = self._upload_data(semantic_path)
-        raw = self._upload_data(raw_path)
-        raw = self._extract_domain(raw)
+        semantic, raw = self._upload_raw(semantic_path, raw_path)
 
         if self.mode is DataReprMode.RAW:
             data = self._default_mode(semantic, raw)
@@ -124,9 +481,58 @@ class DataRepr(object):
         self,
         validation_path: str,
     ) -> pd.DataFrame:
-        data = self._upload_data(validation_path)
+        data = self._upload_data(validation_path, DATA.validation_cols)
         return data
 
+    def proccess_lazy(
+        self,
+        semantic_path: str,
+        raw_path: str,
+    ) -> LazyDecart:
+        """
+        Cartesian product (DataReprMode.RAW_DECART) without materialization:
+        the pairs are taken by blocks (LazyDecart.blocks)
+        """
+        if self.mode != DataReprMode.RAW_DECART:
+            raise NotImplementedError("Lazy data is implemented for decart mode")
+
+        semantic, raw = self._upload_raw(semantic_path, raw_path)
+        site, _semantic = self._decart_sides(semantic, raw)
+        labels = self._decart_labels(site, _semantic, raw)
+
+        # brands are the candidates signal only, they aren't in the pairs rows
+        site_brands, semantic_brands = None, None
+        if RAW.BRAND in raw.columns:
+            site_brands = raw.loc[site.index, RAW.BRAND]
+        if SEMANTIC.BRAND in semantic.columns:
+            semantic_brands = semantic.loc[_semantic.index, SEMANTIC.BRAND]
+
+        return LazyDecart(
+            self._change_side(site),
+            self._change_side(_semantic),
+            labels,
+            site_brands,
+            semantic_brands,
+        )
+
+    def proccess_chunks(
+        self,
+        validation_path: str,
+        chunk_size: int = 100_000,
+    ):
+        """
+        Yield the validation file by chunks of rows (only for
+        DataReprMode.VALIDATION: raw modes merge the whole files)
+        """
+        if self.mode != DataReprMode.VALIDATION:
+            raise NotImplementedError("Chunks are implemented for validation mode")
+
+        columns = DATA.validation_cols if self.project_columns else None
+        for data in iter_data(validation_path, columns, chunk_size):
+            data = self._expand_str_column(data, DATA.ROW)
+            data = self._expand_str_column(data, DATA.CLIENT_NAME)
+            yield data
+
     def proccess(
         self,
         semantic_path: str,
@@ -1,6 +1,7 @@
 import pandas as pd
 import numpy as np
 from abc import ABC, abstractmethod
+from collections import deque
 from typing import Union
 import re
 import multiprocessing
@@ -85,6 +86,185 @@ class VendorCodeExtractor(object):
         return semantic
 
 
+class VendorCodeSearchMode(object):
+    REGEX = "regex"
+    INVERTED = "inverted"
+
+
+class AhoCorasick(object):
+    """Automaton to find all occurrences of many strings by one scan of the text"""
+
+    def __init__(self, patterns: list[str]) -> None:
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        for index, pattern in enumerate(patterns):
+            self._add(pattern, index)
+        self._build()
+
+    def _add(self, pattern: str, index: int) -> None:
+        state = 0
+        for char in pattern:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto[state][char] = next_state
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            state = next_state
+        self.output[state].append(index)
+
+    def _build(self) -> None:
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+
+                fail = self.fail[state]
+                while fail and char not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[next_state] = self.goto[fail].get(char, 0)
+                self.output[next_state] += self.output[self.fail[next_state]]
+
+    def iter(self, text: str):
+        """Yield (end position, pattern index) of every occurrence"""
+        goto, fail, output = self.goto, self.fail, self.output
+
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for index in output[state]:
+                yield position, index
+
+
+class VendorCodeIndex(object):
+    """
+    Inverted index of the vendor codes: all codes, which regexes match
+    the row, are found by one scan of the row.
+
+    The regex of the code is its literal segments joined by optional
+    any symbol (VendorCode.SYMBOLS_CHANGE_TO) instead of every separator.
+    The segments are found by Aho-Corasick automaton (case insensitive)
+    and joined to the codes, if the gaps between them are not longer
+    than the separators of the code. Codes with regex symbols in the
+    segments are searched by their regexes.
+
+    - values - values of the vendor codes
+    """
+
+    REGEX_SYMBOLS = set(".^$*+?{}[]\\|()")
+
+    def __init__(self, values: list[str]) -> None:
+        self.values = values
+
+        self.segments = {}  # segment -> segment index
+        self.codes = {}  # first segment index -> [(code, segments, gaps)]
+        self.regex_codes = []  # [(code, compiled regex)]
+        self.empty_codes = []  # codes of the separators only
+
+        for code, value in enumerate(values):
+            self._add(code, value)
+
+        segments = sorted(self.segments, key=self.segments.get)
+        self.lengths = [len(segment) for segment in segments]
+        self.automaton = AhoCorasick(segments)
+
+    def _split(self, value: str) -> tuple[list[str], list[int]]:
+        """Return not empty segments and max gaps between them"""
+        segments, gaps = [], []
+        separators = 0
+        parts = re.split(VendorCode.SYMBOLS_TO_CHANGE_IN_VC, value)
+        for index, part in enumerate(parts):
+            if index:
+                separators += 1
+            if part:
+                if segments:
+                    gaps.append(separators)
+                segments.append(part)
+                separators = 0
+        return segments, gaps
+
+    def _is_literal(self, segment: str) -> bool:
+        return not (self.REGEX_SYMBOLS & set(segment)) and len(segment.lower()) == len(
+            segment
+        )
+
+    def _add(self, code: int, value: str) -> None:
+        segments, gaps = self._split(value)
+        if not all(self._is_literal(segment) for segment in segments):
+            rx = VendorCode(value, VENDOR_CODE.TYPE.ORIGINAL).rx
+            self.regex_codes.append((code, re.compile(rx, re.IGNORECASE)))
+            return
+
+        if not segments:
+            self.empty_codes.append(code)
+            return
+
+        segments = [
+            self.segments.setdefault(segment.lower(), len(self.segments))
+            for segment in segments
+        ]
+        self.codes.setdefault(segments[0], []).append((code, segments, gaps))
+
+    def _code_found(
+        self,
+        segments: list[int],
+        gaps: list[int],
+        starts: dict[int, set],
+        row: str,
+    ) -> bool:
+        ends = {start + self.lengths[segments[0]] for start in starts[segments[0]]}
+        for segment, gap in zip(segments[1:], gaps):
+            segment_starts = starts.get(segment)
+            if not segment_starts:
+                return False
+
+            ends = {
+                start + self.lengths[segment]
+                for end in ends
+                for start in range(end, end + gap + 1)
+                # optional symbol of the regex doesn't match the new line
+                if start in segment_starts and "\n" not in row[end:start]
+            }
+            if not ends:
+                return False
+        return True
+
+    def findall(self, row: str) -> set[int]:
+        """Return indexes of the codes, which regexes match the row"""
+        lowered = row.lower()
+        if len(lowered) != len(row):
+            return {
+                code
+                for code, value in enumerate(self.values)
+                if re.search(
+                    VendorCode(value, VENDOR_CODE.TYPE.ORIGINAL).rx,
+                    row,
+                    re.IGNORECASE,
+                )
+            }
+
+        starts = {}
+        for position, segment in self.automaton.iter(lowered):
+            starts.setdefault(segment, set()).add(position - self.lengths[segment] + 1)
+
+        found = set(self.empty_codes)
+        for first in starts:
+            for code, segments, gaps in self.codes.get(first, []):
+                if self._code_found(segments, gaps, starts, lowered):
+                    found.add(code)
+
+        for code, compiled in self.regex_codes:
+            if compiled.search(row):
+                found.add(code)
+        return found
+
+
 class AbstractVendorCodeSearch(ABC):
     def __init__(self) -> None:
         pass
@@ -101,8 +281,22 @@ class VendorCodeSearch(AbstractVendorCodeSearch):
     def __init__(
         self,
         skip_validated: bool = True,
+        search_mode: VendorCodeSearchMode = VendorCodeSearchMode.REGEX,
     ) -> None:
+        """
+        - search_mode - VendorCodeSearchMode.REGEX searches every distinct
+        code in every distinct row by its regex, VendorCodeSearchMode.INVERTED
+        scans every distinct row once by the index of all codes (with the same
+        output; for many codes and rows, e.g. DataReprMode.RAW_DECART)
+        """
+        if search_mode not in [
+            VendorCodeSearchMode.REGEX,
+            VendorCodeSearchMode.INVERTED,
+        ]:
+            raise ValueError("Unknown vendor code search mode")
+
         self.skip_validated = skip_validated
+        self.search_mode = search_mode
 
     def _validate(self, row: pd.Series) -> pd.Series:
         if row[DATA.VC]:
@@ -131,6 +325,61 @@ class VendorCodeSearch(AbstractVendorCodeSearch):
         row[VENDOR_CODE.STATUS] = "No vendor code"
         return row
 
+    def _explode(self, data: pd.DataFrame) -> pd.DataFrame:
+        """One row per vendor code of the data rows (in the order of the codes)"""
+
+        vendor_codes = data[DATA.VC].to_list()
+        lengths = [len(codes) if codes else 0 for codes in vendor_codes]
+        vendor_codes = [code for codes in vendor_codes if codes for code in codes]
+
+        return pd.DataFrame(
+            {
+                "position": np.repeat(np.arange(len(data)), lengths),
+                "value": [vendor_code.value for vendor_code in vendor_codes],
+                "rx": [vendor_code.rx for vendor_code in vendor_codes],
+                "type": [vendor_code.type for vendor_code in vendor_codes],
+            }
+        )
+
+    def _match(self, rxs: pd.Series, rows: np.ndarray) -> np.ndarray:
+        """
+        Search every regex in its row. Every distinct regex is compiled once
+        and searched once in every distinct row.
+        """
+        rx_codes, rx_uniques = pd.factorize(rxs)
+        row_codes, row_uniques = pd.factorize(rows, use_na_sentinel=False)
+        compiled = [re.compile(rx, re.IGNORECASE) for rx in rx_uniques]
+
+        pairs = rx_codes.astype(np.int64) * len(row_uniques) + row_codes
+        pair_uniques, pair_codes = np.unique(pairs, return_inverse=True)
+        matched = np.array(
+            [
+                compiled[pair // len(row_uniques)].search(
+                    row_uniques[pair % len(row_uniques)]
+                )
+                is not None
+                for pair in pair_uniques
+            ],
+            dtype=bool,
+        )
+        return matched[pair_codes.reshape(-1)]
+
+    def _match_inverted(self, values: pd.Series, rows: np.ndarray) -> np.ndarray:
+        """_match by the index of the codes: every distinct row is scanned once"""
+
+        value_codes, value_uniques = pd.factorize(values)
+        row_codes, row_uniques = pd.factorize(rows, use_na_sentinel=False)
+
+        index = VendorCodeIndex(list(value_uniques))
+        found = [
+            row_code * len(value_uniques) + value_code
+            for row_code, row in enumerate(row_uniques)
+            for value_code in index.findall(row)
+        ]
+
+        pairs = row_codes.astype(np.int64) * len(value_uniques) + value_codes
+        return np.isin(pairs, np.array(found, dtype=np.int64))
+
     def validate(
         self,
         data: pd.DataFrame,
@@ -138,6 +387,35 @@ class VendorCodeSearch(AbstractVendorCodeSearch):
     ) -> pd.DataFrame:
         if self.skip_validated:
             data = data[data[DATA.VALIDATION_STATUS] == 0]
+        data = data.copy()
+
+        exploded = self._explode(data)
+        rows = data[DATA.ROW].to_numpy()[exploded["position"].to_numpy()]
+        if self.search_mode == VendorCodeSearchMode.INVERTED:
+            matched = self._match_inverted(exploded["value"], rows)
+        else:
+            matched = self._match(exploded["rx"], rows)
+        exploded = exploded[matched]
+
+        # the first matched vendor code of the row validates it
+        matched_type = exploded.groupby("position")["type"].first()
+        matched = np.zeros(len(data), dtype=bool)
+        matched[matched_type.index] = True
+        types = np.full(len(data), "", dtype=object)
+        types[matched_type.index] = matched_type.to_numpy()
+
+        has_vc = np.array([bool(codes) for codes in data[DATA.VC]], dtype=bool)
+        not_validated = has_vc & ~matched
+
+        data[DATA.VALIDATION_STATUS] = np.where(has_vc, 1, data[DATA.VALIDATION_STATUS])
+        data[DATA.VALIDATED] = np.where(not_validated, 0, data[DATA.VALIDATED])
+        data[VENDOR_CODE.VALIDATED] = np.where(
+            not_validated, 0, data[VENDOR_CODE.VALIDATED]
+        )
+        data[VENDOR_CODE.STATUS] = np.select(
+            [~has_vc, matched],
+            ["No vendor code", "Validated by " + types],
+            "Not validated",
+        )
 
-        data = data.apply(self._validate, axis=1)
         return data, [DATA.VALIDATED, VENDOR_CODE.VALIDATED, VENDOR_CODE.STATUS]